@@ -0,0 +1,235 @@
+# benchmark of Registry.build per phase on a generated profile web served from a local http server
+# every size runs in its own process so the singletons (caches, metrics) start empty,
+# the phases are timed exclusively: time spent in a nested phase (merge inside extract) is only counted once
+#
+#   discovery  detect_csv_files, make_entries_array
+#   check      entries_array_check
+#   harvest    Crawler.crawl, KnowledgeGraphRegistry.addProfile
+#   merge      Crawler.getCompleteKG
+#   extract    Crawler.getListDictsProfiles, KnowledgeGraphRegistry.extractMetadata
+#   serialise  write_registry_files
+#   render     make_profile_pages, make_search_index, make_html_file_registry
+#
+# usage (from the root of the repository):
+#   python benchmark/bench_build.py --sizes 10 100 1000 10000
+#   python benchmark/bench_build.py --save-baseline      # store the timings as benchmark/baseline.json
+#   python benchmark/bench_build.py                      # compare with the baseline, exit code 1 on a regression
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+BENCHMARK = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(BENCHMARK, "..", "src")
+DEFAULT_BASELINE = os.path.join(BENCHMARK, "baseline.json")
+PHASES = [
+    "discovery",
+    "check",
+    "harvest",
+    "merge",
+    "extract",
+    "serialise",
+    "render",
+]
+
+
+class PhaseTimer:
+    """
+    wall time per phase, time spent in a nested timed call is subtracted from the outer phase
+    """
+
+    def __init__(self):
+        self.totals = {phase: 0.0 for phase in PHASES}
+        self.stack = []  # time spent in nested calls, per running call
+
+    def wrap(self, phase, function):
+        def timed(*args, **kwargs):
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.stack.pop()
+                self.totals[phase] += elapsed - nested
+                if len(self.stack) > 0:
+                    self.stack[-1] += elapsed
+
+        return timed
+
+
+def run_one(size, workers, seed):
+    """
+    generate a web of size profiles, build the registry of it and return the timings,
+    runs in a child process of the suite
+    """
+    sys.path.insert(0, BENCHMARK)
+    sys.path.insert(0, SRC)
+    from web import generate, serve
+
+    workdir = tempfile.mkdtemp(prefix="bench-build-")
+    try:
+        # the build writes to Location/build and reads Location/templates
+        os.symlink(os.path.abspath(os.path.join(SRC, "templates")), os.path.join(workdir, "templates"))
+        os.chdir(workdir)
+        os.makedirs(os.path.join(workdir, "web"))
+        server, base_url = serve(os.path.join(workdir, "web"))
+        data, _ = generate(workdir, size, base_url, seed=seed)
+
+        from utils.singleton.location import Location
+
+        Location(root=workdir)
+        from utils.singleton.logger import configure_logging
+        from utils.singleton.ratelimiter import RateLimiter
+        from utils.singleton.http_client import HttpClient
+        from utils.singleton.http_cache import HttpCache
+        from utils.singleton.query_registry import QueryRegistry
+        from utils.singleton.metrics import Metrics
+        from utils.registry import Registry
+
+        configure_logging("WARNING")
+        RateLimiter(rate=0)
+        HttpCache(directory=None)
+        HttpClient(pool_maxsize=max(workers, 10))
+        QueryRegistry().load()
+        registry = Registry(data_path=data, base=base_url, workers=workers)
+
+        timer = PhaseTimer()
+        for phase, owner, names in [
+            ("discovery", registry, ["detect_csv_files", "make_entries_array"]),
+            ("check", registry, ["entries_array_check"]),
+            ("harvest", registry.crawler, ["crawl"]),
+            ("harvest", registry.knowledge_graph_registry, ["addProfile"]),
+            ("merge", registry.crawler, ["getCompleteKG"]),
+            ("extract", registry.crawler, ["getListDictsProfiles"]),
+            ("extract", registry.knowledge_graph_registry, ["extractMetadata"]),
+            ("serialise", registry, ["write_registry_files"]),
+            (
+                "render",
+                registry,
+                ["make_profile_pages", "make_search_index", "make_html_file_registry"],
+            ),
+        ]:
+            for name in names:
+                setattr(owner, name, timer.wrap(phase, getattr(owner, name)))
+        start = time.perf_counter()
+        registry.build()
+        total = time.perf_counter() - start
+        server.shutdown()
+        return {
+            "profiles": size,
+            "rows": len(registry.registry_array),
+            "phases": timer.totals,
+            "total": total,
+            "requests": Metrics().get("response_store.fetches"),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """
+    :return: list of (size, phase, baseline seconds, seconds) of the phases that got slower
+    than the baseline by more than tolerance (a fraction) and min_seconds
+    """
+    regressions = []
+    for size, result in results.items():
+        if size not in baseline:
+            continue
+        before = dict(baseline[size]["phases"], total=baseline[size]["total"])
+        after = dict(result["phases"], total=result["total"])
+        for phase, seconds in after.items():
+            if phase not in before:
+                continue
+            if seconds > before[phase] * (1 + tolerance) and seconds - before[phase] > min_seconds:
+                regressions.append((size, phase, before[phase], seconds))
+    return regressions
+
+
+def print_table(results):
+    header = ["profiles"] + PHASES + ["total", "requests"]
+    print(" ".join("{0:>10}".format(column) for column in header))
+    for size, result in results.items():
+        row = [size] + ["{0:.3f}".format(result["phases"][phase]) for phase in PHASES]
+        row += ["{0:.3f}".format(result["total"]), result["requests"]]
+        print(" ".join("{0:>10}".format(column) for column in row))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the timings as the baseline instead of comparing with it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="fraction a phase may be slower than the baseline before it is flagged",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.05,
+        help="phases that got less than this many seconds slower are not flagged",
+    )
+    # used by the suite to run one size in a child process
+    parser.add_argument("--run-one", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.run_one is not None:
+        # child process: print the timings of one size as json
+        print(json.dumps(run_one(args.run_one, args.workers, args.seed)))
+        sys.exit(0)
+
+    results = {}
+    for size in args.sizes:
+        print("building a registry of {0} profiles".format(size), file=sys.stderr)
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-one",
+                str(size),
+                "--workers",
+                str(args.workers),
+                "--seed",
+                str(args.seed),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results[str(size)] = json.loads(output.strip().splitlines()[-1])
+    print_table(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print("baseline saved to {0}".format(args.baseline))
+        sys.exit(0)
+    if not os.path.isfile(args.baseline):
+        print("no baseline at {0}, run with --save-baseline first".format(args.baseline))
+        sys.exit(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+    for size, phase, before, after in regressions:
+        print(
+            "REGRESSION {0} profiles, {1}: {2:.3f}s -> {3:.3f}s".format(
+                size, phase, before, after
+            )
+        )
+    sys.exit(1 if len(regressions) > 0 else 0)
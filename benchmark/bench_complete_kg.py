@@ -0,0 +1,131 @@
+# benchmark of building the complete harvested graph on a 3-level synthetic registry
+# level 0 is a registry entry, level 1 registries, level 2 ro-crates and level 3 profiles
+# no network is used, the harvest of each uri is replaced by a synthetic graph
+#
+# usage (from the root of the repository):
+#   python benchmark/bench_complete_kg.py --registries 10 --crates 10 --profiles 5
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+import rdflib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.singleton.location import Location  # noqa: E402
+
+Location(root=os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.crawler import Crawler  # noqa: E402
+from utils.profileharvester import ProfileHarvester  # noqa: E402
+
+SCHEMA = rdflib.Namespace("http://schema.org/")
+PROF = rdflib.Namespace("http://www.w3.org/ns/dx/prof/")
+BASE = "http://bench.example.org/"
+
+
+def make_web(registries, crates, profiles, triples):
+    """
+    make the synthetic web of uri => (graph, candidates)
+    """
+    web = {}
+    entry = BASE + "registry"
+    web[entry] = []
+    for r in range(registries):
+        registry = "{0}registry/{1}".format(BASE, r)
+        web[entry].append(registry)
+        web[registry] = []
+        for c in range(crates):
+            crate = "{0}/crate/{1}".format(registry, c)
+            web[registry].append(crate)
+            web[crate] = []
+            for p in range(profiles):
+                profile = "{0}/profile/{1}".format(crate, p)
+                web[crate].append(profile)
+                web[profile] = []
+    graphs = {}
+    for uri, candidates in web.items():
+        graph = rdflib.Graph()
+        subject = rdflib.URIRef(uri)
+        if len(candidates) == 0:
+            graph.add((subject, rdflib.RDF.type, PROF.Profile))
+        for candidate in candidates:
+            graph.add((subject, SCHEMA.conformsTo, rdflib.URIRef(candidate)))
+        for t in range(triples):
+            graph.add((subject, SCHEMA.keywords, rdflib.Literal(t)))
+        graphs[uri] = (graph, [rdflib.URIRef(c) for c in candidates])
+    return entry, graphs
+
+
+def legacy_complete_kg(harvester, children):
+    # the recursive merge that was used before: a full graph copy per addition
+    for child in children[id(harvester)]:
+        harvester.kg = harvester.kg + legacy_complete_kg(child, children)
+    return harvester.kg
+
+
+def run_legacy(entry, graphs, calls):
+    harvesters = {}
+    children = {}
+    for uri, (graph, candidates) in graphs.items():
+        harvester = ProfileHarvester(uri)
+        harvester.kg = rdflib.Graph() + graph
+        harvesters[uri] = harvester
+    for uri, (graph, candidates) in graphs.items():
+        children[id(harvesters[uri])] = [
+            harvesters[str(c)] for c in candidates
+        ]
+    start = time.perf_counter()
+    for _ in range(calls):
+        complete = legacy_complete_kg(harvesters[entry], children)
+    return time.perf_counter() - start, len(complete)
+
+
+def run_crawler(entry, graphs, calls):
+    def harvest(self):
+        graph, candidates = graphs[str(self.entry_uri)]
+        self.kg = rdflib.Graph() + graph
+        self.candidates = candidates
+
+    ProfileHarvester.harvest = harvest
+    crawler = Crawler()
+    crawler.add_entry(entry)
+    crawler.crawl()
+    start = time.perf_counter()
+    for _ in range(calls):
+        complete = crawler.getCompleteKG(entry)
+    return time.perf_counter() - start, len(complete)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--registries", type=int, default=10)
+    parser.add_argument("--crates", type=int, default=10)
+    parser.add_argument("--profiles", type=int, default=5)
+    parser.add_argument(
+        "--triples", type=int, default=20, help="extra triples per document"
+    )
+    parser.add_argument(
+        "--calls",
+        type=int,
+        default=3,
+        help="number of times the complete graph is asked for, the build asks 3 times per entry",
+    )
+    args = parser.parse_args()
+    entry, graphs = make_web(
+        args.registries, args.crates, args.profiles, args.triples
+    )
+    print("documents: {0}".format(len(graphs)))
+    legacy_time, legacy_size = run_legacy(entry, graphs, args.calls)
+    print(
+        "recursive graph additions: {0:.3f}s ({1} triples)".format(
+            legacy_time, legacy_size
+        )
+    )
+    crawler_time, crawler_size = run_crawler(entry, graphs, args.calls)
+    print(
+        "crawler dataset merge:     {0:.3f}s ({1} triples)".format(
+            crawler_time, crawler_size
+        )
+    )
@@ -0,0 +1,223 @@
+# synthetic profile web for the build benchmarks, shaped like the fixtures in test/data
+# a data folder with a registry csv and a web folder with the documents the csv rows point to:
+#   - json-ld and turtle profiles
+#   - ro-crates that conform to profiles
+#   - html pages with a <link rel=describedby> to their ro-crate
+#   - registries listing profiles, crates and (nested) other registries
+# the web folder is served by a local http server so the build fetches it like the real web
+
+import os
+import csv
+import json
+import random
+import threading
+import functools
+import http.server
+
+# the context of the generated json-ld documents, inline so nothing is fetched from the internet
+CONTEXT = {
+    "schema": "http://schema.org/",
+    "prof": "http://www.w3.org/ns/dx/prof/",
+    "Profile": "prof:Profile",
+    "CreativeWork": "schema:CreativeWork",
+    "Dataset": "schema:Dataset",
+    "ItemList": "schema:ItemList",
+    "name": "schema:name",
+    "description": "schema:description",
+    "keywords": "schema:keywords",
+    "author": "schema:author",
+    "version": "schema:version",
+    "license": {"@id": "schema:license", "@type": "@id"},
+    "about": {"@id": "schema:about", "@type": "@id"},
+    "conformsTo": {"@id": "schema:conformsTo", "@type": "@id"},
+    "hasPart": {"@id": "schema:hasPart", "@type": "@id"},
+    "itemListElement": {"@id": "schema:itemListElement", "@type": "@id"},
+}
+
+WORDS = (
+    "marine biology ocean sensor dataset sample station cruise species "
+    "taxonomy sediment plankton observation model climate coast river "
+    "metadata crate profile registry archive measurement"
+).split()
+
+AUTHORS = ["Ann", "Bob", "Carl", "Dee", "Eve", "Finn", "Gus", "Hana"]
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def write_profile(web, base_url, index, rng):
+    """
+    write profile number index, every third profile is turtle, the others json-ld
+    :return: the uri of the profile
+    """
+    name = "Profile {0} {1}".format(index, rng.choice(WORDS))
+    description = " ".join(rng.choice(WORDS) for _ in range(12))
+    keywords = rng.sample(WORDS, 3)
+    authors = rng.sample(AUTHORS, rng.randint(1, 2))
+    if index % 3 == 2:
+        uri = "{0}profiles/p{1}/profile.ttl".format(base_url, index)
+        lines = [
+            "@prefix schema: <http://schema.org/> .",
+            "@prefix prof: <http://www.w3.org/ns/dx/prof/> .",
+            "<{0}> a prof:Profile, schema:CreativeWork ;".format(uri),
+            '    schema:name "{0}" ;'.format(name),
+            '    schema:description "{0}" ;'.format(description),
+            "    schema:keywords {0} ;".format(
+                ", ".join('"{0}"'.format(k) for k in keywords)
+            ),
+            "    schema:author {0} ;".format(
+                ", ".join('"{0}"'.format(a) for a in authors)
+            ),
+            '    schema:version "1.{0}" .'.format(index % 10),
+        ]
+        write(os.path.join(web, "profiles", "p{0}".format(index), "profile.ttl"), "\n".join(lines) + "\n")
+        return uri
+    uri = "{0}profiles/p{1}/profile.json".format(base_url, index)
+    document = {
+        "@context": CONTEXT,
+        "@graph": [
+            {
+                "@id": "./profile.json",
+                "@type": ["CreativeWork", "Profile"],
+                "name": name,
+                "description": description,
+                "keywords": keywords,
+                "author": authors,
+                "version": "1.{0}".format(index % 10),
+                "license": "https://creativecommons.org/licenses/by/4.0/",
+            }
+        ],
+    }
+    write(
+        os.path.join(web, "profiles", "p{0}".format(index), "profile.json"),
+        json.dumps(document),
+    )
+    return uri
+
+
+def write_crate(web, base_url, folder, profiles):
+    """
+    write an ro-crate that conforms to the profiles
+    :return: the uri of the ro-crate-metadata.json
+    """
+    document = {
+        "@context": CONTEXT,
+        "@graph": [
+            {"@id": "ro-crate-metadata.json", "about": "./"},
+            {
+                "@id": "./",
+                "@type": "Dataset",
+                "name": "crate {0}".format(folder),
+                "conformsTo": profiles,
+            },
+        ],
+    }
+    write(os.path.join(web, folder, "ro-crate-metadata.json"), json.dumps(document))
+    return "{0}{1}/ro-crate-metadata.json".format(base_url, folder)
+
+
+def write_html(web, base_url, folder):
+    """
+    write an html landing page that links its ro-crate with rel=describedby
+    :return: the uri of the page
+    """
+    write(
+        os.path.join(web, folder, "index.html"),
+        '<html><head><link rel=describedby href="./ro-crate-metadata.json" '
+        'type="application/ld+json"/></head><body>{0}</body></html>\n'.format(folder),
+    )
+    return "{0}{1}/".format(base_url, folder)
+
+
+def write_registry(web, base_url, folder, items):
+    """
+    write a registry that lists the items
+    :return: the uri of the registry
+    """
+    document = {
+        "@context": CONTEXT,
+        "@graph": [
+            {"@id": "./", "hasPart": "_:list"},
+            {"@id": "_:list", "@type": "ItemList", "itemListElement": items},
+        ],
+    }
+    write(os.path.join(web, folder, "registry.json"), json.dumps(document))
+    return "{0}{1}/registry.json".format(base_url, folder)
+
+
+def generate(folder, profiles, base_url, seed=0):
+    """
+    generate the data folder (registry.csv) and the web folder for a number of profiles.
+    There is one csv row per profile, of every 10 rows 6 point to a profile,
+    2 to an ro-crate, 1 to an html page and 1 to a registry (every other registry lists the one before it)
+    :param folder: the folder to generate in, gets a data and a web folder
+    :param profiles: the number of profiles (and csv rows)
+    :param base_url: the url the web folder is served at, ending with /
+    :param seed: the seed of the random metadata
+    :return: tuple of the data folder and the web folder
+    """
+    rng = random.Random(seed)
+    data = os.path.join(folder, "data")
+    web = os.path.join(folder, "web")
+    os.makedirs(data, exist_ok=True)
+    os.makedirs(web, exist_ok=True)
+    rows = []
+    registries = []
+    for index in range(profiles):
+        profile = write_profile(web, base_url, index, rng)
+        kind = index % 10
+        if kind < 6:
+            rows.append(profile)
+        elif kind < 8:
+            rows.append(
+                write_crate(web, base_url, "crates/c{0}".format(index), [profile])
+            )
+        elif kind == 8:
+            write_crate(web, base_url, "pages/h{0}".format(index), [profile])
+            rows.append(write_html(web, base_url, "pages/h{0}".format(index)))
+        else:
+            items = [profile]
+            if len(registries) % 2 == 1:
+                # every other registry nests the one before it, its profiles are
+                # reached again and deduplicated by the crawler
+                items.append(registries[-1])
+            registry = write_registry(
+                web, base_url, "registries/r{0}".format(index), items
+            )
+            registries.append(registry)
+            rows.append(registry)
+    with open(os.path.join(data, "registry.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["URI", "contact"])
+        for row in rows:
+            writer.writerow([row, "benchmark@example.org"])
+    return data, web
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    extensions_map = {
+        **http.server.SimpleHTTPRequestHandler.extensions_map,
+        ".json": "application/ld+json",
+        ".ttl": "text/turtle",
+    }
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(web):
+    """
+    serve the web folder on a free local port in a background thread
+    :param web: the folder to serve
+    :return: tuple of the server (call shutdown() to stop it) and its base url
+    """
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=web)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}/".format(server.server_address[1])
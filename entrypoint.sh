@@ -10,6 +10,14 @@ echo "repo name is " $GITHUB_REPOSITORY
 
 echo "base_uri is " $INPUT_BASE_URI
 
+echo "workers is " $INPUT_WORKERS
+
+echo "cache_dir is " $INPUT_CACHE_DIR
+
+echo "page_size is " $INPUT_PAGE_SIZE
+
+echo "profile is " $INPUT_PROFILE
+
 tree -a ./src
 
 #perform a tree on the github workspace
@@ -31,9 +39,17 @@ pip install -r requirements.txt
 #echo "files in ./src/data"
 #tree -a ./src/data
 
+#the profiling flags of the profile input
+PROFILE_ARGS=""
+case "$INPUT_PROFILE" in
+  cpu) PROFILE_ARGS="--profile-cpu" ;;
+  memory) PROFILE_ARGS="--profile-memory" ;;
+  all) PROFILE_ARGS="--profile-cpu --profile-memory" ;;
+esac
+
 #run the python script
 cd src/
-python main.py $INPUT_BASE_URI
+python main.py $INPUT_BASE_URI --workers ${INPUT_WORKERS:-1} --cache-dir $GITHUB_WORKSPACE/${INPUT_CACHE_DIR:-.profile-registry-cache} --page-size ${INPUT_PAGE_SIZE:-0} --log-level ${INPUT_LOG_LEVEL:-INFO} $PROFILE_ARGS
 cd ..
 
 #make a folder in ./github/workspace called unicornpages
@@ -7,8 +7,15 @@ import os
 from pathlib import Path
 import sys
 from utils.singleton.location import Location
-from utils.singleton.logger import get_logger
-from utils.registry import Registry
+from utils.singleton.logger import get_logger, configure_logging
+from utils.registry import Registry, PHASES
+from utils.singleton.ratelimiter import RateLimiter, MAX_RETRY_AFTER
+from utils.singleton.http_cache import HttpCache
+from utils.singleton.http_client import HttpClient
+from utils.singleton.profiler import Profiler
+from utils.singleton.query_registry import QueryRegistry
+from utils.singleton.response_store import ResponseStore
+from utils.singleton.metrics import Metrics
 #add argument parser
 from argparse import ArgumentParser
 
@@ -24,14 +31,237 @@ if not os.path.isdir("data"):
 
 logger.info("Start of gh-pages build")
 
+# prepare the sparql templates once, a missing template stops the build before anything is fetched
+try:
+    QueryRegistry().load()
+except FileNotFoundError as e:
+    logger.error(str(e))
+    sys.exit(1)
+
 data_path = Path(Location().get_location()) / "data"
 
 #parse first argument as base_uri
 parser = ArgumentParser()
 parser.add_argument("base_uri", help="base uri of the registry")
-base_uri = parser.parse_args().base_uri
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="number of harvests that can run at the same time, 1 harvests sequentially",
+)
+parser.add_argument(
+    "--rate",
+    type=float,
+    default=3.0,
+    help="maximum number of requests per second to a single host, 0 disables the limit",
+)
+parser.add_argument(
+    "--burst",
+    type=int,
+    default=3,
+    help="number of requests that can be sent to a host at once before the rate applies",
+)
+parser.add_argument(
+    "--host-rate",
+    action="append",
+    default=[],
+    metavar="HOST=RATE",
+    help="requests per second for a specific host, can be given multiple times",
+)
+parser.add_argument(
+    "--max-retry-after",
+    type=float,
+    default=MAX_RETRY_AFTER,
+    help="longest Retry-After in seconds that is waited for, a uri asking for more fails instead",
+)
+parser.add_argument(
+    "--no-negotiate",
+    dest="negotiate",
+    action="store_false",
+    help="request each rdf mimetype separately instead of one q-weighted request",
+)
+parser.add_argument(
+    "--cache-dir",
+    default=None,
+    help="folder of the http cache that is kept between builds, no cache is used if not given",
+)
+parser.add_argument(
+    "--pool-connections",
+    type=int,
+    default=10,
+    help="number of hosts to keep a pool of keep-alive connections for",
+)
+parser.add_argument(
+    "--pool-maxsize",
+    type=int,
+    default=None,
+    help="number of keep-alive connections per host, defaults to the number of workers (at least 10)",
+)
+parser.add_argument(
+    "--connect-timeout",
+    type=float,
+    default=10.0,
+    help="seconds to wait for a connection to a host",
+)
+parser.add_argument(
+    "--read-timeout",
+    type=float,
+    default=30.0,
+    help="seconds to wait for a host to send data",
+)
+parser.add_argument(
+    "--max-depth",
+    type=int,
+    default=None,
+    help="maximum number of levels to crawl below a registry entry, no limit if not given",
+)
+parser.add_argument(
+    "--sparql-detection",
+    action="store_true",
+    help="detect profiles and candidates with templates/profiles.sparql and candidate_profiles.sparql, use this when the templates are customised",
+)
+parser.add_argument(
+    "--page-size",
+    type=int,
+    default=0,
+    help="number of profiles per page of the registry index, 0 puts all profiles on one page",
+)
+parser.add_argument(
+    "--serialize-workers",
+    type=int,
+    default=None,
+    help="number of processes writing the registry as ttl, jsonld, rdf and nt and the profile pages, one per cpu if not given, 1 writes them in the main process and keeps a single copy of the registry in memory",
+)
+parser.add_argument(
+    "--compress",
+    action="store_true",
+    help="also write gzipped copies of the registry, registry.ttl.gz and registry.nt.gz",
+)
+parser.add_argument(
+    "--csv-include",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="only use the csv files matching this glob (relative to the data folder), can be given more than once",
+)
+parser.add_argument(
+    "--csv-ignore",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="skip the folders and csv files matching this glob (relative to the data folder), can be given more than once, .git and node_modules are always skipped",
+)
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="keep the build folder and only write the outputs that changed since the last build, without it everything is rebuilt",
+)
+parser.add_argument(
+    "--profile-cpu",
+    action="store_true",
+    help="profile the build with cProfile and write build/profile.pstats and build/profile.txt, cProfile only sees the main thread so this sets --workers 1 and --serialize-workers 1",
+)
+parser.add_argument(
+    "--profile-memory",
+    action="store_true",
+    help="trace the allocations of the build with tracemalloc and write the top allocation sites to build/memory.txt, tracemalloc only sees the main process so this sets --serialize-workers 1",
+)
+parser.add_argument(
+    "--profile-phase",
+    action="append",
+    default=[],
+    choices=PHASES,
+    help="only profile this phase of the build, can be given more than once, without it the whole build is profiled",
+)
+parser.add_argument(
+    "--profile-top",
+    type=int,
+    default=30,
+    help="number of functions and allocation sites in the profile reports",
+)
+parser.add_argument(
+    "--log-level",
+    default="INFO",
+    choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+    help="level of the messages written to the console and logs.log",
+)
+args = parser.parse_args()
+configure_logging(args.log_level)
+base_uri = args.base_uri
 logger.info("Base URI: {}".format(base_uri))
 
-registry = Registry(data_path=data_path, base=str(base_uri))
-registry.build()
+# the profilers only see the work done in the main thread (cProfile) or the main process (tracemalloc),
+# so that work is not handed to worker threads or processes while profiling
+if args.profile_cpu and args.workers != 1:
+    logger.warning(
+        "Profiling the cpu, running with --workers 1 instead of {0}".format(args.workers)
+    )
+    args.workers = 1
+if (args.profile_cpu or args.profile_memory) and args.serialize_workers != 1:
+    logger.warning(
+        "Profiling, running with --serialize-workers 1 instead of {0}".format(
+            args.serialize_workers or "one per cpu"
+        )
+    )
+    args.serialize_workers = 1
+
+host_rates = {}
+for host_rate in args.host_rate:
+    host, _, rate = host_rate.rpartition("=")
+    try:
+        rate = float(rate)
+    except ValueError:
+        rate = None
+    if not host or rate is None or rate < 0:
+        parser.error(
+            "argument --host-rate: invalid value {0!r}, expected HOST=RATE with a number of requests per second".format(
+                host_rate
+            )
+        )
+    host_rates[host.lower()] = rate
+RateLimiter(
+    rate=args.rate,
+    burst=args.burst,
+    host_rates=host_rates,
+    max_retry_after=args.max_retry_after,
+)
+HttpCache(directory=args.cache_dir)
+HttpClient(
+    pool_connections=args.pool_connections,
+    pool_maxsize=args.pool_maxsize or max(args.workers, 10),
+    connect_timeout=args.connect_timeout,
+    read_timeout=args.read_timeout,
+)
+if args.cache_dir is not None:
+    logger.info("Http cache: {}".format(args.cache_dir))
+# the singletons the worker threads share are made here, before any thread is started
+ResponseStore()
+Metrics()
+Profiler(
+    cpu=args.profile_cpu,
+    memory=args.profile_memory,
+    phases=args.profile_phase,
+    top=args.profile_top,
+)
+
+registry = Registry(
+    data_path=data_path,
+    base=str(base_uri),
+    workers=args.workers,
+    negotiate=args.negotiate,
+    max_depth=args.max_depth,
+    sparql_detection=args.sparql_detection,
+    page_size=args.page_size,
+    incremental=args.incremental,
+    serialize_workers=args.serialize_workers,
+    compress=args.compress,
+    csv_include=args.csv_include,
+    csv_ignore=args.csv_ignore,
+)
+try:
+    registry.build()
+except Exception as e:
+    # the error is logged where it happened, also in worker processes
+    logger.error("Build failed: {0}".format(e))
+    sys.exit(1)
 registry.report()
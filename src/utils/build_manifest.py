@@ -0,0 +1,208 @@
+# this file will contain the build manifest class
+# the manifest is kept in the build folder and holds the hash of the inputs of the last build
+# (csv rows, fetched bodies, templates and options), the hash of every output it wrote and,
+# for the outputs that depend on one part of the inputs (like a profile page), the hash of that part.
+# An incremental build keeps all outputs when nothing changed, otherwise it keeps the outputs
+# whose part did not change and only rewrites the changed files.
+# It also keeps the mtime, size and rows of the csv files so unchanged csv files are not read again
+
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from utils.singleton.logger import get_logger
+from utils.singleton.metrics import Metrics
+
+logger = get_logger()
+
+MANIFEST_FILE = ".build-manifest.json"
+
+
+def file_hash(path):
+    """
+    :param path: the file to hash
+    :return: the sha256 hex digest of the content of the file
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, build_folder, load=True):
+        """
+        :param build_folder: the folder the outputs are written to, the manifest is kept in it
+        :param load: read the manifest of the last build, a full build starts without it
+        """
+        self.build_folder = build_folder
+        self.path = os.path.join(build_folder, MANIFEST_FILE)
+        self.previous_inputs = None
+        self.previous_outputs = {}  # output name => hash, of the last build
+        self.previous_sources = {}  # output name => hash of what it was made from, of the last build
+        self.previous_csv_files = {}  # csv path => {"mtime", "size", "rows"}, of the last build
+        self.inputs = None
+        self.outputs = {}  # output name => hash, of this build
+        self.sources = {}  # output name => hash of what it was made from, of this build
+        self.csv_files = {}  # csv path => {"mtime", "size", "rows"}, of this build
+        if load:
+            self.load()
+
+    def __repr__(self) -> str:
+        return f"BuildManifest(outputs={len(self.outputs)})"
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.previous_inputs = manifest.get("inputs")
+        self.previous_outputs = manifest.get("outputs", {})
+        self.previous_sources = manifest.get("sources", {})
+        self.previous_csv_files = manifest.get("csv_files", {})
+
+    def csv_rows(self, name, stat):
+        """
+        get the rows of a csv file as they were read in the last build
+        :param name: the path of the csv file relative to the data folder
+        :param stat: the os.stat of the csv file
+        :return: the list of rows or None if the file changed (or is new)
+        """
+        entry = self.previous_csv_files.get(name)
+        if (
+            entry is None
+            or entry["mtime"] != stat.st_mtime_ns
+            or entry["size"] != stat.st_size
+        ):
+            return None
+        self.csv_files[name] = entry
+        return entry["rows"]
+
+    def set_csv_rows(self, name, stat, rows):
+        """
+        keep the rows of a csv file for the next build
+        :param name: the path of the csv file relative to the data folder
+        :param stat: the os.stat of the csv file
+        :param rows: list of the rows of the file
+        """
+        self.csv_files[name] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "rows": rows,
+        }
+
+    def set_inputs(self, inputs):
+        """
+        :param inputs: the hash of all the inputs of this build
+        """
+        self.inputs = inputs
+
+    def unchanged(self):
+        """
+        check if the inputs are the same as in the last build
+        and all outputs of the last build are still in the build folder as they were written
+        :return: True if the outputs can be kept as they are
+        """
+        if self.inputs is None or self.inputs != self.previous_inputs:
+            return False
+        return all(self.intact(name) for name in self.previous_outputs)
+
+    def intact(self, name):
+        """
+        :param name: the path of an output of the last build relative to the build folder
+        :return: True if the output is still in the build folder as it was written
+        """
+        digest = self.previous_outputs.get(name)
+        path = os.path.join(self.build_folder, name)
+        return digest is not None and os.path.isfile(path) and file_hash(path) == digest
+
+    def keep_outputs(self):
+        """
+        keep all the outputs of the last build
+        """
+        self.outputs = dict(self.previous_outputs)
+        self.sources = dict(self.previous_sources)
+        Metrics().incr("build.outputs_unchanged", len(self.outputs))
+
+    def keep_unchanged(self, names, source):
+        """
+        keep outputs of the last build that were made from the same source
+        and are still in the build folder as they were written
+        :param names: the paths of the outputs made from the source, relative to the build folder
+        :param source: the hash of what the outputs are made from
+        :return: True if the outputs are kept, False if they have to be written again
+        """
+        for name in names:
+            if self.previous_sources.get(name) != source or not self.intact(name):
+                return False
+        for name in names:
+            self.outputs[name] = self.previous_outputs[name]
+            self.sources[name] = source
+        Metrics().incr("build.outputs_unchanged", len(names))
+        return True
+
+    @contextmanager
+    def output(self, name, source=None):
+        """
+        write an output of the build, yields a temporary path to write the output to.
+        The output is only moved into the build folder when its content changed,
+        so unchanged files keep their modification time
+        :param name: the path of the output relative to the build folder
+        :param source: the hash of what the output is made from, for keep_unchanged in the next build
+        """
+        path = os.path.join(self.build_folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=".tmp-"
+        )
+        os.close(fd)
+        # mkstemp makes the file readable for the owner only
+        os.chmod(tmp_path, 0o644)
+        try:
+            yield tmp_path
+            digest = file_hash(tmp_path)
+            self.outputs[name] = digest
+            if source is not None:
+                self.sources[name] = source
+            if os.path.isfile(path) and file_hash(path) == digest:
+                Metrics().incr("build.outputs_unchanged")
+            else:
+                os.replace(tmp_path, path)
+                Metrics().incr("build.outputs_written")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def remove_stale(self, keep=()):
+        """
+        remove every file in the build folder that this build did not write,
+        the outputs of the last build and files left from before there was a manifest,
+        and the folders that are empty after that
+        :param keep: names of files relative to the build folder that are written
+        after the outputs (like the metrics of the build) and are not removed
+        """
+        for root, dirs, files in os.walk(self.build_folder, topdown=False):
+            for file in files:
+                path = os.path.join(root, file)
+                name = os.path.relpath(path, self.build_folder).replace(os.sep, "/")
+                if name == MANIFEST_FILE or name in self.outputs or name in keep:
+                    continue
+                logger.info("Removing stale output {0}".format(name))
+                os.remove(path)
+                Metrics().incr("build.outputs_removed")
+            if root != self.build_folder and len(os.listdir(root)) == 0:
+                os.rmdir(root)
+
+    def save(self):
+        manifest = {
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "sources": self.sources,
+            "csv_files": self.csv_files,
+        }
+        os.makedirs(self.build_folder, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
@@ -0,0 +1,190 @@
+# this file will contain the crawler class
+# the crawler harvests the registry entries and every candidate they lead to from a work queue
+# instead of recursing, the parent/child provenance is kept as data in the crawler
+
+import heapq
+import rdflib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.singleton.logger import get_logger
+from utils.singleton.metrics import Metrics
+from utils.profileharvester import ProfileHarvester, get_list_dicts_profiles
+
+logger = get_logger()
+
+
+class Crawler:
+    def __init__(
+        self, negotiate=True, max_depth=None, workers=1, sparql_detection=False
+    ):
+        """
+        :param negotiate: if the harvesters negotiate the mimetype in one request
+        :param sparql_detection: if the harvesters detect profiles with the sparql templates
+        :param max_depth: candidates deeper than this below an entry are not harvested, None means no limit
+        :param workers: maximum number of harvests running at the same time
+        """
+        self.negotiate = negotiate
+        self.sparql_detection = sparql_detection
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+        self.harvesters = {}  # uri => ProfileHarvester, each uri is harvested once per build
+        self.depths = {}  # uri => depth at which the uri was first reached
+        self.children = {}  # uri => list of candidate uris found in it (provenance)
+        self.frontier = []  # heap of (priority, sequence, uri) still to harvest
+        self.sequence = 0
+        # all harvested triples, one named graph per harvested uri
+        self.dataset = rdflib.Dataset()
+        self.complete_kgs = {}  # uri => merged graph of all reachable uris, built once
+
+    def __repr__(self) -> str:
+        return f"Crawler(harvesters={len(self.harvesters)}, frontier={len(self.frontier)})"
+
+    def add_entry(self, uri):
+        """
+        add an entry of the registry to the frontier
+        :param uri: the uri of the entry
+        :return: the harvester of the entry
+        """
+        return self.enqueue(uri, depth=0)
+
+    def enqueue(self, uri, depth):
+        """
+        add a uri to the frontier if it was not reached before
+        :param uri: the uri to harvest
+        :param depth: the number of levels below a registry entry
+        :return: the harvester of the uri
+        """
+        key = str(uri)
+        if key in self.harvesters:
+            Metrics().incr("crawl.deduplicated")
+            return self.harvesters[key]
+        self.harvesters[key] = ProfileHarvester(
+            uri,
+            negotiate=self.negotiate,
+            sparql_detection=self.sparql_detection,
+        )
+        self.depths[key] = depth
+        self.children[key] = []
+        # breadth first: shallow uris are harvested before deeper ones
+        heapq.heappush(self.frontier, (depth, self.sequence, key))
+        self.sequence += 1
+        return self.harvesters[key]
+
+    def crawl(self):
+        """
+        harvest the frontier until it is empty,
+        up to self.workers harvests run at the same time,
+        with 1 worker the uris are harvested one by one in this thread
+        """
+        logger.info("Crawling with {0} workers".format(self.workers))
+        if self.workers <= 1:
+            while len(self.frontier) > 0:
+                _, _, key = heapq.heappop(self.frontier)
+                self.harvesters[key].harvest()
+                self.collect(key)
+                self.expand(key)
+        else:
+            self.crawl_concurrently()
+        logger.info(
+            "Crawl finished, {0} uris harvested".format(len(self.harvesters))
+        )
+
+    def crawl_concurrently(self):
+        """
+        harvest the frontier on a pool of self.workers threads,
+        a uri is collected and expanded as soon as its harvest is done
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            while len(self.frontier) > 0 or len(pending) > 0:
+                while len(self.frontier) > 0 and len(pending) < self.workers:
+                    _, _, key = heapq.heappop(self.frontier)
+                    future = executor.submit(self.harvesters[key].harvest)
+                    pending[future] = key
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    future.result()
+                    self.collect(key)
+                    self.expand(key)
+
+    def collect(self, key):
+        """
+        move the graph of a harvested uri into its named graph of the dataset
+        :param key: the uri that was harvested
+        """
+        harvester = self.harvesters[key]
+        named_graph = self.dataset.graph(rdflib.URIRef(key))
+        named_graph += harvester.kg
+        harvester.kg = named_graph
+
+    def expand(self, key):
+        """
+        add the candidates of a harvested uri to the frontier
+        :param key: the uri that was harvested
+        """
+        candidates = self.harvesters[key].candidates
+        depth = self.depths[key]
+        if len(candidates) == 0:
+            return
+        if self.max_depth is not None and depth >= self.max_depth:
+            logger.info(
+                "max crawl depth {0} reached at {1}, {2} candidates not harvested".format(
+                    self.max_depth, key, len(candidates)
+                )
+            )
+            Metrics().incr("crawl.depth_limited", len(candidates))
+            return
+        for candidate in candidates:
+            if not isinstance(candidate, rdflib.URIRef):
+                # blank nodes and literals can not be fetched
+                logger.debug("skipping candidate {0}".format(candidate))
+                continue
+            self.enqueue(candidate, depth + 1)
+            self.children[key].append(str(candidate))
+
+    def get_harvester(self, uri):
+        return self.harvesters[str(uri)]
+
+    def reachable(self, uri):
+        """
+        get the harvesters of the uri and of all the uris reachable from it,
+        each harvester only once so cycles between registries are safe
+        :param uri: the uri to start from
+        :return: list of harvesters, starting with the one of the uri
+        """
+        reached = [str(uri)]
+        seen = {str(uri)}
+        for key in reached:
+            for child in self.children[key]:
+                if child not in seen:
+                    seen.add(child)
+                    reached.append(child)
+        return [self.harvesters[key] for key in reached]
+
+    def getProfiles(self, uri):
+        profiles = set()
+        for harvester in self.reachable(uri):
+            profiles = profiles.union(harvester.profiles)
+        return profiles
+
+    def getCompleteKG(self, uri):
+        """
+        get the merged graph of the uri and all the uris reachable from it,
+        the graph is built once (linear in the number of triples) and reused
+        :param uri: the uri to start from
+        :return: the merged graph, do not modify it
+        """
+        key = str(uri)
+        if key not in self.complete_kgs:
+            complete = rdflib.Graph()
+            for harvester in self.reachable(key):
+                complete += harvester.kg
+            self.complete_kgs[key] = complete
+        return self.complete_kgs[key]
+
+    def get_kg(self, uri):
+        # serialize the complete graph to ttl and return it
+        return self.getCompleteKG(uri).serialize(format="turtle")
+
+    def getListDictsProfiles(self, uri):
+        return get_list_dicts_profiles(self.getCompleteKG(uri))
@@ -3,16 +3,43 @@
 import os
 import sys
 import shutil
+import threading
 from utils.singleton import location
 from utils.singleton.logger import get_logger
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 
 logger = get_logger()
 
+# one jinja environment for the whole build, made on first use
+# each template is read and compiled once per process and the compiled
+# bytecode is kept on disk (in the temp folder) for the next builds
+_environment = None
+_environment_lock = threading.Lock()
 
-def setup_build_folder():
+
+def get_environment():
+    """
+    get the jinja environment over the templates folder
+    :return: the jinja environment
+    """
+    global _environment
+    with _environment_lock:
+        if _environment is None:
+            _environment = Environment(
+                loader=FileSystemLoader(
+                    os.path.join(location.Location().get_location(), "templates")
+                ),
+                bytecode_cache=FileSystemBytecodeCache(),
+                # the templates do not change during a build
+                auto_reload=False,
+            )
+        return _environment
+
+
+def setup_build_folder(clean=True):
     """
     this function will setup the build folder
+    :param clean: remove everything in the build folder, incremental builds keep it
     """
     # check if the build folder exists
     logger.info("Setting up build folder")
@@ -21,7 +48,7 @@ def setup_build_folder():
         os.path.join(location.Location().get_location(), "build")
     ):
         os.mkdir(os.path.join(location.Location().get_location(), "build"))
-    else:
+    elif clean:
         # if it exists, clean it
         clean_build_folder()
 
@@ -59,76 +86,48 @@ def clean_build_folder():
         sys.exit(1)
 
 
-# template file here to make html files
-def make_html_file(template_file, **kwargs):
+def write_html_file(template_file, destination, **kwargs):
     """
-    this function will make the html file
-    :param template_file: the template file to use
+    render a template straight to a file, the page is written while it is
+    generated so it is never held in memory as a whole
+    :param template_file: the template file to use, relative to the templates folder
+    :param destination: the path of the html file to write
     :param kwargs: the arguments to pass to the template file
-    :return: the html file
+    :raises Exception: when the template can not be rendered or the file not written
     """
-    logger.info("Making html file")
-    logger.debug(location.Location().get_location())
-    # check if the build folder exists
-    if not os.path.isdir(
-        os.path.join(location.Location().get_location(), "build")
-    ):
-        logger.error("Build folder does not exist")
-        sys.exit(1)
-    # check if the template file exists
-    if not os.path.isfile(
-        os.path.join(
-            location.Location().get_location(), "templates", template_file
-        )
-    ):
-        logger.error("Template file does not exist")
-        sys.exit(1)
-    # check if the html file exists
-    if os.path.isfile(
-        os.path.join(
-            location.Location().get_location(), "build", template_file
-        )
-    ):
-        logger.error("Html file already exists")
-        sys.exit(1)
-    # read the template file
+    logger.info("Writing html file {}".format(destination))
     try:
-        template = Template(
-            open(
-                os.path.join(
-                    location.Location().get_location(),
-                    "templates",
-                    template_file,
-                )
-            ).read()
-        )
-        # render the template file
-        html = template.render(**kwargs)
+        template = get_environment().get_template(template_file)
+        with open(destination, "w") as f:
+            f.writelines(template.generate(**kwargs))
     except Exception as e:
-        logger.error("Error rendering template file: {}".format(e))
+        logger.error(
+            "Error rendering template file {0}: {1}".format(template_file, e)
+        )
         logger.debug(
             "Error rendering template file: {}".format(e), exc_info=True
         )
-        sys.exit(1)
-    return html
+        raise
 
-def addBaseToRegistry(base):
+
+def paginate(items, page_size):
     """
-    This function will add the @base string to the beginning of the registry.ttl document located in the build folder
-    :param base: the base string to add
+    split the items of the index over pages, the first page is index.html
+    and the next ones page-2.html, page-3.html, ...
+    :param items: list of the items to show
+    :param page_size: maximum number of items per page, 0 or None for one page
+    :return: list of dicts with the number, file name and items of each page
     """
-    # check if the build folder exists and if the registry.ttl file exists
-    if os.path.isdir( location.Location().get_location() + "/build" ) and os.path.isfile( location.Location().get_location() + "/build/registry.ttl" ):
-        # open the registry.ttl file
-        with open( location.Location().get_location() + "/build/registry.ttl", "r" ) as f:
-            # read the file
-            data = f.read()
-        #make string to add => @base <base>    
-        base_string = "@base <" + base + "> ."
-        # open the registry.ttl file
-        with open( location.Location().get_location() + "/build/registry.ttl", "w" ) as f:
-            # write the data
-            f.write( base_string + "\n" + data )
-    else:
-        logger.error("Build folder does not exist")
-    
+    if not page_size or page_size <= 0:
+        page_size = max(len(items), 1)
+    pages = []
+    for start in range(0, max(len(items), 1), page_size):
+        number = len(pages) + 1
+        pages.append(
+            {
+                "number": number,
+                "file": "index.html" if number == 1 else "page-{0}.html".format(number),
+                "items": items[start : start + page_size],
+            }
+        )
+    return pages
@@ -0,0 +1,84 @@
+# this file will contain the functions that write the page of a single profile
+# every profile gets a folder in build/profiles/ with a landing page and the subgraph
+# of the profile in turtle and json-ld, so a profile page does not depend on the size of the registry
+
+import re
+import json
+import hashlib
+from utils.html_build_util import write_html_file
+from utils.rdflib_utils import serialize_snapshot
+from utils.rdf_writer import nt_term, sort_key
+
+# the folder in the build folder that holds the profile folders
+PROFILES_FOLDER = "profiles"
+
+# the files in the folder of a profile, by kind
+PROFILE_PAGE_FILES = {
+    "html": "index.html",
+    "turtle": "profile.ttl",
+    "json-ld": "profile.json",
+}
+
+
+def profile_folder(uri):
+    """
+    get the folder of the page of a profile, a readable part of the uri
+    with a short hash so different uris never share a folder
+    :param uri: the uri of the profile
+    :return: the folder relative to the build folder, ending with a /
+    """
+    readable = re.sub(r"[^A-Za-z0-9]+", "-", str(uri).split("://", 1)[-1])
+    readable = readable.strip("-")[-60:].strip("-")
+    digest = hashlib.sha1(str(uri).encode("utf-8")).hexdigest()[:8]
+    return "{0}/{1}-{2}/".format(PROFILES_FOLDER, readable, digest)
+
+
+def page_source(url, metadata, triples, namespaces, templates):
+    """
+    hash everything the page of a profile is made from,
+    so an incremental build can keep the page when none of it changed
+    :param url: the url the index links the profile to
+    :param metadata: dict with the metadata shown on the page
+    :param triples: the triples of the subgraph of the profile, with canonical blank node labels
+    :param namespaces: list of (prefix, namespace) pairs
+    :param templates: the hash of the templates
+    :return: the sha256 hex digest
+    """
+    hasher = hashlib.sha256()
+    hasher.update(
+        json.dumps(
+            [url, metadata, [[prefix, str(namespace)] for prefix, namespace in namespaces], templates],
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    )
+    for triple in sorted(triples, key=sort_key):
+        hasher.update(" ".join(nt_term(term) for term in triple).encode("utf-8"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def write_profile_page(uri, url, metadata, triples, namespaces, destinations):
+    """
+    write the landing page and the turtle and json-ld subgraph of one profile.
+    This runs in a worker process, so it only takes picklable arguments
+    :param uri: the uri of the profile in the registry graph
+    :param url: the url the index links the profile to
+    :param metadata: dict with the metadata shown on the page
+    :param triples: the triples of the subgraph of the profile
+    :param namespaces: list of (prefix, namespace) pairs to bind
+    :param destinations: dict of kind (PROFILE_PAGE_FILES) => path of the file to write
+    """
+    serialize_snapshot(triples, namespaces, "turtle", destinations["turtle"])
+    serialize_snapshot(triples, namespaces, "json-ld", destinations["json-ld"])
+    write_html_file(
+        "profile.html",
+        destinations["html"],
+        title=metadata.get("name") or uri,
+        uri=uri,
+        url=url,
+        metadata=metadata,
+        theme="main",
+        files=PROFILE_PAGE_FILES,
+    )
+    return uri
@@ -1,19 +1,117 @@
 # this file will contain the profileharvester class
 
-import requests
 import rdflib
-import time
+from rdflib import RDF
 from utils.singleton.logger import get_logger
-from utils.singleton.location import Location
-import os
-import sys
+from utils.uri_checks import get_url
+from utils.singleton.metrics import Metrics
+from utils.rdflib_utils import (
+    MIME_TYPE_FORMATS,
+    parse_rdf,
+    extract_metadata_batch,
+    shape_metadata,
+)
+from utils.singleton.query_registry import QueryRegistry, NAMESPACES
 
 logger = get_logger()
 
+SCHEMA = NAMESPACES["schema"]
+PROF = NAMESPACES["prof"]
+
+# the rdf mimetypes we can parse, in order of preference
+MIME_TYPES = [
+    "text/turtle",
+    "application/ld+json",
+    "application/rdf+xml",
+    "application/json",
+]
+# Accept header that asks for all MIME_TYPES in one request, weighted by preference
+# anything else (like a html landing page) is still accepted with the lowest weight
+NEGOTIATE_ACCEPT = ", ".join(
+    ["{0};q={1}".format(mime_type, round(1 - index / 10, 1))
+     for index, mime_type in enumerate(MIME_TYPES)]
+    + ["*/*;q=0.1"]
+)
+
+
+def get_entry_accept(negotiate=True):
+    """
+    get the Accept header of the first request a ProfileHarvester sends for an entry,
+    requests with the same Accept header share the response of that request
+    :param negotiate: if the harvester negotiates the mimetype in one request
+    :return: the Accept header
+    """
+    if negotiate:
+        return NEGOTIATE_ACCEPT
+    return MIME_TYPES[0]
+
+
+def is_html_response(response):
+    """
+    :param response: a response or None
+    :return: True if the response is a 200 html page
+    """
+    return (
+        response is not None
+        and response.status_code == 200
+        and "text/html" in response.headers.get("Content-Type", "")
+    )
+
+
+def find_profiles(kg):
+    """
+    find the profiles in a kg with direct index lookups,
+    gives the same profiles as templates/profiles.sparql
+    :param kg: the kg to look in
+    :return: list of the profiles
+    """
+    return list(dict.fromkeys(kg.subjects(RDF.type, PROF.Profile)))
+
+
+def find_candidates(kg):
+    """
+    find the candidates in a kg with direct index lookups,
+    gives the same candidates, in the same order of union branches,
+    as templates/candidate_profiles.sparql
+    :param kg: the kg to look in
+    :return: list of the candidates without duplicates
+    """
+    candidates = {}
+    # ?rocrate schema:conformsTo ?candidate . [] schema:about ?rocrate .
+    for rocrate in kg.objects(None, SCHEMA.about):
+        for candidate in kg.objects(rocrate, SCHEMA.conformsTo):
+            candidates[candidate] = None
+    # [] schema:hasPart/schema:itemListElement ?candidate .
+    for part in kg.objects(None, SCHEMA.hasPart):
+        for candidate in kg.objects(part, SCHEMA.itemListElement):
+            candidates[candidate] = None
+    # [] schema:hasPart ?candidate .
+    for candidate in kg.objects(None, SCHEMA.hasPart):
+        candidates[candidate] = None
+    return list(candidates)
+
+
+def find_profiles_sparql(kg):
+    """
+    find the profiles in a kg with templates/profiles.sparql
+    """
+    return [result[0] for result in QueryRegistry().query(kg, "profiles")]
+
+
+def find_candidates_sparql(kg):
+    """
+    find the candidates in a kg with templates/candidate_profiles.sparql
+    """
+    results = QueryRegistry().query(kg, "candidate_profiles")
+    return list(dict.fromkeys(result[0] for result in results))
+
 
 class ProfileHarvester:
-    def __init__(self, uri):
+    def __init__(self, uri, negotiate=True, sparql_detection=False):
         self.entry_uri = uri  # rename entry_uri
+        self.negotiate = negotiate  # try a single q-weighted request before the per mimetype requests
+        # detect profiles and candidates with the (possibly overridden) sparql templates instead of index lookups
+        self.sparql_detection = sparql_detection
         # add state var for set of profiles (ie _uri) harvested from entry_uri
         self.entry_uri_content = None  # rename entry_content
         self.entry_uri_content_type = None  # this will be categorically set to ["profile","crate","registry","other"]
@@ -22,11 +120,12 @@ class ProfileHarvester:
         self.check_again = True
         self.profiles = set()  # set of profiles harvested from entry_uri
         self.kg = rdflib.Graph()
-        self.children = []
+        self.candidates = []  # uris found in the kg that can hold more profiles, crawled by the Crawler
 
     def harvest(self):
         """
-        this function will harvest the metadata from the uri provided
+        this function will harvest the metadata from the uri provided only,
+        the candidates that are discovered are left to the Crawler
         """
         while self.check_again:
             self.check_entry_uri_content_and_type()
@@ -54,18 +153,19 @@ class ProfileHarvester:
         if there is no link then set self.uri to self.uri+ro-crate-metadata.json and self.uri_change to True
         """
         self.check_again = False
-        mime_types = [
-            "text/turtle",
-            "application/ld+json",
-            "application/rdf+xml",
-            "application/json",
-        ]
+        mime_types = MIME_TYPES
+        response = None
+        fetched_uri = self.entry_uri  # the uri response belongs to
+        negotiated = False
+        if self.negotiate:
+            response, negotiated = self.negotiate_entry_uri_content_and_type()
         for mime_type in mime_types:
+            if negotiated:
+                break
             try:
-                response = requests.get(
+                response = get_url(
                     self.entry_uri, headers={"Accept": mime_type}
                 )
-                time.sleep(0.3)  # check if lib exists to do this ratelimit
                 logger.debug(
                     "trying to get metadata from entry_uri {0} with mimetype {1}".format(
                         self.entry_uri, mime_type
@@ -82,7 +182,7 @@ class ProfileHarvester:
                     # if it is not then set self.uri to self.uri+ro-crate-metadata.json and self.uri_change to True
                     if mime_type in response.headers["Content-Type"]:
                         self.entry_uri_type = mime_type
-                        self.entry_uri_content = response.text
+                        self.entry_uri_content = response.content
                         break
             except Exception as e:
                 logger.error(
@@ -140,7 +240,13 @@ class ProfileHarvester:
                 )
 
             try:
-                response = requests.get(self.entry_uri)
+                # the rdf requests are often answered with the html page already,
+                # only ask for it again when there is no such response for this uri
+                if not (
+                    self.entry_uri == fetched_uri
+                    and is_html_response(response)
+                ):
+                    response = get_url(self.entry_uri)
                 if (
                     response.status_code == 200
                     and "text/html" in response.headers["Content-Type"]
@@ -194,6 +300,55 @@ class ProfileHarvester:
                 self.bad_entry_uri = True
                 pass
 
+    def negotiate_entry_uri_content_and_type(self):
+        """
+        do one request with a q-weighted Accept header for all MIME_TYPES
+        and pick the parser from the Content-Type that is returned.
+        A html page is kept as it is, it is searched for a describedby link
+        without requesting it again.
+        Only when the request fails or the Content-Type is neither one of MIME_TYPES
+        nor html then the per mimetype requests in check_entry_uri_content_and_type are used as fallback
+        :return: tuple of the response (None if the request failed) and
+        True if the per mimetype requests are not needed
+        """
+        try:
+            response = get_url(
+                self.entry_uri, headers={"Accept": NEGOTIATE_ACCEPT}
+            )
+        except Exception as e:
+            logger.debug(
+                "Error negotiating metadata from entry_uri {0} : {1}".format(
+                    self.entry_uri, str(e)
+                )
+            )
+            response = None
+        if response is not None and response.status_code == 200:
+            content_type = response.headers.get("Content-Type", "")
+            for index, mime_type in enumerate(MIME_TYPES):
+                if mime_type in content_type:
+                    logger.debug(
+                        "negotiated mimetype {0} for entry_uri {1}".format(
+                            mime_type, self.entry_uri
+                        )
+                    )
+                    self.entry_uri_type = mime_type
+                    self.entry_uri_content = response.content
+                    # the per mimetype loop would have done index requests before this one
+                    Metrics().incr("negotiation.requests_saved", index)
+                    return response, True
+            if is_html_response(response):
+                logger.debug(
+                    "negotiated html for entry_uri {0}".format(self.entry_uri)
+                )
+                # the per mimetype loop would have done a request for every mimetype,
+                # the last of them is reused for the html
+                Metrics().incr("negotiation.requests_saved", len(MIME_TYPES) - 1)
+                return response, True
+        # the negotiation request comes on top of the per mimetype requests
+        Metrics().incr("negotiation.fallbacks")
+        Metrics().incr("negotiation.extra_requests")
+        return response, False
+
     def is_bad_entry_uri(self):
         return self.bad_entry_uri
 
@@ -201,36 +356,13 @@ class ProfileHarvester:
         """
         insert the metadata into the graph
         """
-        if (
-            self.entry_uri_type == "application/json"
-            or self.entry_uri_type == "application/ld+json"
-        ):
-            self.kg.parse(
-                data=self.entry_uri_content,
-                format="json-ld",
+        if self.entry_uri_type in MIME_TYPE_FORMATS:
+            parse_rdf(
+                self.kg,
+                self.entry_uri_content,
+                MIME_TYPE_FORMATS[self.entry_uri_type],
                 base=self.entry_uri,
             )
-        elif self.entry_uri_type == "application/rdf+xml":
-            self.kg.parse(
-                data=self.entry_uri_content, format="xml", base=self.entry_uri
-            )
-        elif self.entry_uri_type == "application/rdf+json":
-            self.kg.parse(
-                data=self.entry_uri_content,
-                format="json-ld",
-                base=self.entry_uri,
-            )
-        elif self.entry_uri_type == "text/turtle":
-            # decode the self.entry_uri_content to utf-8
-            # entry_uri = self.entry_uri.decode("utf-8")
-            self.kg.parse(
-                self.entry_uri, format="turtle"
-            )  # got an error here when using the base parameter
-
-    def get_kg(self):
-        # serialize the graph to ttl and return it
-        self.getCompleteKG()
-        return self.kg.serialize(format="turtle")
 
     def extract_type_from_kg(self):
         """
@@ -262,124 +394,52 @@ class ProfileHarvester:
             # [] schema:hasPart ?candidate .
         }
         """
-        if not os.path.isfile(
-            os.path.join(
-                Location().get_location(), "templates", "profiles.sparql"
-            )
-        ):
-            logger.error("Template file does not exist")
-            sys.exit(1)
-        query = open(
-            os.path.join(
-                Location().get_location(), "templates", "profiles.sparql"
-            )
-        ).read()
-        # before doing the queries change the kg to have the entry_uri as base_uri instead of the file uri
-        self.kg
-
-        results = self.kg.query(query)
-        if len(results) > 0:
+        # by default the same patterns are matched with direct lookups on the indexes of the kg,
+        # the sparql templates are only run when sparql_detection is set
+        if self.sparql_detection:
+            profiles = find_profiles_sparql(self.kg)
+        else:
+            profiles = find_profiles(self.kg)
+        if len(profiles) > 0:
             self.type = "profile"
             logger.debug("uri has profile(s)")
             # get the profiles and add them to the set
-            for result in results:
-                logger.debug("profile: {0}".format(result[0]))
-                self.profiles.add(result[0])
+            for profile in profiles:
+                logger.debug("profile: {0}".format(profile))
+                self.profiles.add(profile)
             return
 
-        if not os.path.isfile(
-            os.path.join(
-                Location().get_location(),
-                "templates",
-                "candidate_profiles.sparql",
-            )
-        ):
-            logger.error("Template file does not exist")
-            sys.exit(1)
-        query = open(
-            os.path.join(
-                Location().get_location(),
-                "templates",
-                "candidate_profiles.sparql",
-            )
-        ).read()
-
-        results = self.kg.query(query)
-        if len(results) > 0:
-            # the results are uri that also need to be checked for profiles so we spawn a child thread for each
-            for result in results:
-                child_uri = result[0]
-                logger.debug("child_uri: {0}".format(child_uri))
-                child_profile_harvester = ProfileHarvester(child_uri)
-                self.children.append(child_profile_harvester)
-                child_profile_harvester.harvest()
-
-    def getProfiles(self):
-        # build profiles , possibly by delegates
-        # check if we have children
-        if len(self.children) > 0:
-            for child in self.children:
-                self.profiles = self.profiles.union(child.getProfiles())
-        return self.profiles
-
-    def getCompleteKG(self):
-        # build profiles , possibly by delegates
-        # check if we have children
-        if len(self.children) > 0:
-            for child in self.children:
-                try:
-                    self.kg = self.kg + child.getCompleteKG()
-                except Exception as e:
-                    logger.error(
-                        msg="Error getting complete KG from child {0} : {1}".format(
-                            child, str(e)
-                        )
-                    )
-        return self.kg
-
-    def getListDictsProfiles(self):
-        # first get the complete kg
-        c_kg = self.getCompleteKG()
-        # run query that will extract the triples that we need , check for each of the triples if they exist if not return empty string
-        if not os.path.isfile(
-            os.path.join(
-                Location().get_location(),
-                "templates",
-                "get_metadata_kg_profiles.sparql",
-            )
-        ):
-            logger.error("Template file does not exist")
-            sys.exit(1)
-        query = open(
-            os.path.join(
-                Location().get_location(),
-                "templates",
-                "get_metadata_kg_profiles.sparql",
-            )
-        ).read()
-        results = c_kg.query(query)
-        toreturn = {}
-        for result in results:
-            p_dict = {}
-            uri = result[0]
-            p_dict["name"] = result[1]
-            p_dict["description"] = result[2]
-            p_dict["version"] = result[3]
-            # split the keywords and authors by | and add them as list to the dict
-            # , if empty string then "" , make sure all values are strings and unique
-            keywords = result[4].split("|")
-            # make sure all values are strings and unique
-            u_keywords = list(set([str(x) for x in keywords]))
-            if len(u_keywords) == 0 or u_keywords == [""]:
-                u_keywords = None
-            p_dict["keywords"] = u_keywords
-            p_dict["license"] = result[5]
-            authors = result[6].split("|")
-            u_authors = list(set([str(x) for x in authors]))
-            if len(u_authors) == 1:
-                u_authors = u_authors[0]
-            if len(u_authors) == 0:
-                u_authors = None
-            p_dict["authors"] = u_authors
-            toreturn[uri] = p_dict
-        return toreturn
+        if self.sparql_detection:
+            candidates = find_candidates_sparql(self.kg)
+        else:
+            candidates = find_candidates(self.kg)
+        # the candidates are uris that also need to be checked for profiles, the Crawler harvests them
+        for candidate_uri in candidates:
+            logger.debug("candidate_uri: {0}".format(candidate_uri))
+            self.candidates.append(candidate_uri)
+
+
+def get_list_dicts_profiles(c_kg):
+    """
+    get the metadata of all the profiles in a (complete) kg
+    :param c_kg: the kg to get the profiles from
+    :return: dict of profile uri => dict with the metadata of the profile
+    """
+    # the columns of the registry page, in this order
+    fields = {
+        "name": SCHEMA.name,
+        "description": SCHEMA.description,
+        "version": SCHEMA.version,
+        "keywords": SCHEMA.keywords,
+        "license": SCHEMA.license,
+        "authors": SCHEMA.author,
+    }
+    profiles = find_profiles(c_kg)
+    # read the metadata of all the profiles in one pass, keywords and authors stay lists
+    values = extract_metadata_batch(c_kg, profiles, fields)
+    return {
+        profile: shape_metadata(
+            values[profile], multi_valued=("keywords", "authors")
+        )
+        for profile in profiles
+    }
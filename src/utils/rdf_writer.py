@@ -0,0 +1,387 @@
+# this file will contain the streaming writers for the turtle, n-triples, json-ld and rdf/xml registry files
+# the triples are written subject by subject straight to the file (and to an optional .gz side-car)
+# so the serialized text is never built as one string and the @base and prefixes
+# are written as the file is made instead of being added to it afterwards.
+# The memory use is not bounded: every writer sorts its own copy of the triples in memory.
+# The triples are written in sorted order, so the same graph always gives the same bytes,
+# as long as the blank nodes are relabelled with canonical_bnodes first
+
+import io
+import os
+import re
+import gzip
+import json
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+from contextlib import contextmanager, ExitStack
+from rdflib import Graph, URIRef, BNode, Literal, RDF
+from rdflib.compare import to_canonical_graph
+
+# number of characters collected before they are written to the files
+CHUNK_SIZE = 1 << 16
+
+# local names that can be written as prefix:local in turtle
+LOCAL_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_\-]*$")
+
+# the end of a predicate that can be the local name of an rdf/xml element
+XML_LOCAL_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_.\-]*$")
+
+# characters escaped in rdf/xml text besides &, < and >, a bare \r would be read back as \n
+XML_ESCAPES = {"\r": "&#13;"}
+
+# characters escaped in the n-triples form of a literal
+LITERAL_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"}
+LITERAL_ESCAPE = re.compile(r'[\\"\n\r]')
+
+
+def sort_key(triple):
+    # sorting the triples makes the same graph always give the same file
+    return tuple(term.n3() for term in triple)
+
+
+def canonical_bnodes(triples):
+    """
+    relabel the blank nodes so the same graph always gets the same labels,
+    a parser makes up new labels every time the same data is parsed.
+    Only the triples with a blank node are canonicalized (rdflib.compare),
+    the canonical labels are then numbered b0, b1, ... in sorted order
+    :param triples: the triples
+    :return: list of the triples with the new blank node labels
+    """
+    with_bnodes = Graph()
+    triples_out = []
+    for triple in triples:
+        if isinstance(triple[0], BNode) or isinstance(triple[2], BNode):
+            with_bnodes.add(triple)
+        else:
+            triples_out.append(triple)
+    if len(with_bnodes) == 0:
+        return triples_out
+    canonical = list(to_canonical_graph(with_bnodes))
+    labels = sorted(
+        {term for triple in canonical for term in triple if isinstance(term, BNode)}
+    )
+    names = {label: BNode("b{0}".format(index)) for index, label in enumerate(labels)}
+    triples_out.extend(
+        tuple(names.get(term, term) for term in triple) for triple in canonical
+    )
+    return triples_out
+
+
+@contextmanager
+def atomic_writer(destination, compress=False):
+    """
+    open a text file that is written to a temp file next to the destination
+    and renamed to the destination when the block ends without errors
+    :param destination: the path of the file to write
+    :param compress: gzip the file
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(destination), prefix=".tmp-"
+    )
+    try:
+        with ExitStack() as stack:
+            raw = stack.enter_context(os.fdopen(fd, "wb"))
+            if compress:
+                # no file name and mtime 0 so the same content gives the same .gz
+                raw = stack.enter_context(
+                    gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0)
+                )
+            yield stack.enter_context(io.TextIOWrapper(raw, encoding="utf-8"))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ChunkedWriter:
+    """
+    collects the written text and passes it on to all the files
+    in chunks of about chunk_size characters
+    """
+
+    def __init__(self, files, chunk_size=CHUNK_SIZE):
+        self.files = files
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        data = "".join(self.parts)
+        for f in self.files:
+            f.write(data)
+        self.parts = []
+        self.size = 0
+
+
+@contextmanager
+def open_outputs(destination, compressed_destination=None):
+    """
+    open the file and its optional .gz side-car as one ChunkedWriter
+    :param destination: the path of the file to write
+    :param compressed_destination: the path of the gzipped copy, None to not write it
+    """
+    with ExitStack() as stack:
+        files = [stack.enter_context(atomic_writer(destination))]
+        if compressed_destination is not None:
+            files.append(
+                stack.enter_context(
+                    atomic_writer(compressed_destination, compress=True)
+                )
+            )
+        writer = ChunkedWriter(files)
+        yield writer
+        writer.flush()
+
+
+class PrefixMap:
+    """
+    writes uris as prefix:local when the namespace of the uri is bound
+    """
+
+    def __init__(self, namespaces):
+        self.prefixes = {}  # namespace => prefix
+        for prefix, namespace in namespaces:
+            if prefix and str(namespace) not in self.prefixes:
+                self.prefixes[str(namespace)] = prefix
+
+    def qname(self, uri):
+        """
+        :return: the (prefix, namespace, local name) of the uri or None if it has no usable prefix
+        """
+        cut = max(uri.rfind("#"), uri.rfind("/"))
+        namespace, local = uri[: cut + 1], uri[cut + 1 :]
+        if namespace in self.prefixes and LOCAL_NAME.match(local):
+            return self.prefixes[namespace], namespace, local
+        return None
+
+    def n3(self, term):
+        if isinstance(term, URIRef):
+            qname = self.qname(term)
+            if qname is not None:
+                return "{0}:{1}".format(qname[0], qname[2])
+        return term.n3()
+
+
+def write_turtle(
+    triples, namespaces, destination, base=None, compressed_destination=None
+):
+    """
+    stream the triples to a turtle file, grouped by subject and predicate
+    :param triples: the triples to write
+    :param namespaces: list of (prefix, namespace) pairs, only the used ones are written
+    :param destination: the path of the file to write
+    :param base: the @base of the file, relative uris in the triples are kept relative to it
+    :param compressed_destination: the path of the gzipped copy, None to not write it
+    """
+    triples = sorted(triples, key=sort_key)
+    prefix_map = PrefixMap(namespaces)
+    used = {}
+    for triple in triples:
+        for term in triple:
+            if isinstance(term, URIRef):
+                qname = prefix_map.qname(term)
+                if qname is not None:
+                    used[qname[0]] = qname[1]
+    with open_outputs(destination, compressed_destination) as out:
+        if base is not None:
+            out.write("@base <{0}> .\n".format(base))
+        for prefix in sorted(used):
+            out.write("@prefix {0}: <{1}> .\n".format(prefix, used[prefix]))
+        subject = predicate = None
+        for s, p, o in triples:
+            p_n3 = "a" if p == RDF.type else prefix_map.n3(p)
+            if s != subject:
+                if subject is not None:
+                    out.write(" .\n")
+                out.write("\n{0} {1} {2}".format(prefix_map.n3(s), p_n3, prefix_map.n3(o)))
+            elif p != predicate:
+                out.write(" ;\n    {0} {1}".format(p_n3, prefix_map.n3(o)))
+            else:
+                out.write(",\n        {0}".format(prefix_map.n3(o)))
+            subject, predicate = s, p
+        if subject is not None:
+            out.write(" .\n")
+
+
+def nt_term(term):
+    """
+    :return: the n-triples form of a term, literals are always written on one line
+    (term.n3() uses a triple quoted string for multi line literals, which n-triples does not have)
+    """
+    if not isinstance(term, Literal):
+        return term.n3()
+    text = '"{0}"'.format(
+        LITERAL_ESCAPE.sub(lambda match: LITERAL_ESCAPES[match.group(0)], str(term))
+    )
+    if term.language is not None:
+        return "{0}@{1}".format(text, term.language)
+    if term.datatype is not None:
+        return "{0}^^<{1}>".format(text, term.datatype)
+    return text
+
+
+def write_ntriples(triples, destination, compressed_destination=None):
+    """
+    stream the triples to an n-triples file, one sorted line per triple
+    :param triples: the triples to write, with absolute uris
+    :param destination: the path of the file to write
+    :param compressed_destination: the path of the gzipped copy, None to not write it
+    """
+    with open_outputs(destination, compressed_destination) as out:
+        for triple in sorted(triples, key=sort_key):
+            out.write("{0} {1} {2} .\n".format(*(nt_term(term) for term in triple)))
+
+
+def jsonld_value(term):
+    """
+    :return: the expanded json-ld value object of an object term
+    """
+    if isinstance(term, BNode):
+        return {"@id": "_:{0}".format(term)}
+    if not isinstance(term, Literal):
+        return {"@id": str(term)}
+    value = {"@value": str(term)}
+    if term.language is not None:
+        value["@language"] = term.language
+    elif term.datatype is not None:
+        value["@type"] = str(term.datatype)
+    return value
+
+
+def jsonld_nodes(triples):
+    """
+    group sorted triples in expanded json-ld node objects, one per subject
+    :param triples: the triples, sorted by sort_key
+    :return: generator of the node objects
+    """
+    node = types = subject = None
+    for s, p, o in triples:
+        if s != subject:
+            if node is not None:
+                yield {"@id": node["@id"], **types, **node}
+            subject = s
+            node = {"@id": jsonld_value(s)["@id"]}
+            types = {}  # @type is kept after @id, the properties are added after it
+        if p == RDF.type and not isinstance(o, Literal):
+            types.setdefault("@type", []).append(jsonld_value(o)["@id"])
+        else:
+            node.setdefault(str(p), []).append(jsonld_value(o))
+    if node is not None:
+        yield {"@id": node["@id"], **types, **node}
+
+
+def write_jsonld(triples, destination):
+    """
+    stream the triples to an expanded json-ld file, a list of one node object per subject
+    :param triples: the triples to write, with absolute uris
+    :param destination: the path of the file to write
+    """
+    with open_outputs(destination) as out:
+        out.write("[")
+        separator = "\n"
+        for node in jsonld_nodes(sorted(triples, key=sort_key)):
+            out.write(separator)
+            out.write(
+                "\n".join(
+                    "    " + line
+                    for line in json.dumps(node, indent=4, ensure_ascii=False).split("\n")
+                )
+            )
+            separator = ",\n"
+        out.write("\n]\n" if separator == ",\n" else "]\n")
+
+
+def xml_qnames(triples, namespaces):
+    """
+    get the element name of every predicate, predicates in a namespace
+    without a prefix get a generated ns1, ns2, ... prefix
+    :param triples: the triples, sorted by sort_key
+    :param namespaces: list of (prefix, namespace) pairs
+    :return: tuple of dict of predicate => element name and dict of used prefix => namespace
+    """
+    prefix_map = PrefixMap(namespaces)
+    # the rdf: attributes are written with the rdf prefix
+    prefix_map.prefixes = {
+        namespace: prefix
+        for namespace, prefix in prefix_map.prefixes.items()
+        if prefix != "rdf"
+    }
+    prefix_map.prefixes[str(RDF)] = "rdf"
+    split = {}
+    for predicate in sorted({p for _, p, _ in triples}):
+        match = XML_LOCAL_NAME.search(predicate)
+        if match is None or match.start() == 0:
+            raise ValueError(
+                "predicate {0} can not be written as an rdf/xml element".format(
+                    predicate
+                )
+            )
+        split[predicate] = (predicate[: match.start()], match.group(0))
+    taken = set(prefix_map.prefixes.values())
+    for namespace in sorted({namespace for namespace, _ in split.values()}):
+        if namespace not in prefix_map.prefixes:
+            number = 1
+            while "ns{0}".format(number) in taken:
+                number += 1
+            prefix_map.prefixes[namespace] = "ns{0}".format(number)
+            taken.add("ns{0}".format(number))
+    names = {}
+    used = {"rdf": str(RDF)}
+    for predicate, (namespace, local) in split.items():
+        prefix = prefix_map.prefixes[namespace]
+        names[predicate] = "{0}:{1}".format(prefix, local)
+        used[prefix] = namespace
+    return names, used
+
+
+def xml_node(term):
+    # the attribute that names a subject or object node
+    if isinstance(term, BNode):
+        return "rdf:nodeID={0}".format(quoteattr(str(term)))
+    return "rdf:about={0}".format(quoteattr(str(term)))
+
+
+def write_rdfxml(triples, namespaces, destination):
+    """
+    stream the triples to an rdf/xml file, one rdf:Description per subject
+    :param triples: the triples to write, with absolute uris
+    :param namespaces: list of (prefix, namespace) pairs, only the used ones are written
+    :param destination: the path of the file to write
+    """
+    triples = sorted(triples, key=sort_key)
+    names, used = xml_qnames(triples, namespaces)
+    with open_outputs(destination) as out:
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF\n')
+        for prefix in sorted(used):
+            out.write("   xmlns:{0}={1}\n".format(prefix, quoteattr(used[prefix])))
+        out.write(">\n")
+        subject = None
+        for s, p, o in triples:
+            if s != subject:
+                if subject is not None:
+                    out.write("  </rdf:Description>\n")
+                out.write("  <rdf:Description {0}>\n".format(xml_node(s)))
+                subject = s
+            name = names[p]
+            if isinstance(o, BNode):
+                out.write("    <{0} rdf:nodeID={1}/>\n".format(name, quoteattr(str(o))))
+            elif not isinstance(o, Literal):
+                out.write("    <{0} rdf:resource={1}/>\n".format(name, quoteattr(str(o))))
+            else:
+                attribute = ""
+                if o.language is not None:
+                    attribute = " xml:lang={0}".format(quoteattr(o.language))
+                elif o.datatype is not None:
+                    attribute = " rdf:datatype={0}".format(quoteattr(str(o.datatype)))
+                out.write("    <{0}{1}>{2}</{0}>\n".format(name, attribute, escape(str(o), XML_ESCAPES)))
+        if subject is not None:
+            out.write("  </rdf:Description>\n")
+        out.write("</rdf:RDF>\n")
@@ -3,13 +3,297 @@ from rdflib import Graph, Literal, BNode, URIRef, RDF
 from rdflib.serializer import Serializer
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+from contextlib import contextmanager
 
 # logger
-from utils.singleton.logger import get_logger
+from utils.singleton.logger import (
+    get_logger,
+    lazy,
+    worker_log_queue,
+    use_worker_log_queue,
+)
 from utils.singleton.location import Location
+from utils.singleton.metrics import Metrics
+from utils.uri_checks import get_url
+from utils.rdf_writer import (
+    write_turtle,
+    write_ntriples,
+    write_jsonld,
+    write_rdfxml,
+    sort_key,
+    canonical_bnodes,
+    atomic_writer,
+)
 
 logger = get_logger()
 
+# rdflib parser format for each rdf mimetype
+MIME_TYPE_FORMATS = {
+    "text/turtle": "turtle",
+    "application/ld+json": "json-ld",
+    "application/rdf+json": "json-ld",
+    "application/rdf+xml": "xml",
+    "application/json": "json-ld",
+}
+
+
+def get_rdf_format(content_type, default="json-ld"):
+    """
+    get the rdflib parser format for a Content-Type header
+    :param content_type: the Content-Type header, parameters like charset are ignored
+    :param default: the format to use when the mimetype is not an rdf mimetype
+    :return: the rdflib format
+    """
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    return MIME_TYPE_FORMATS.get(mime_type, default)
+
+
+def get_remote_context(context_uri):
+    """
+    get the content of a remote json-ld @context over the shared http client,
+    the context is fetched once per build thanks to the ResponseStore
+    :param context_uri: the uri of the context
+    :return: the value of the @context in the remote document
+    """
+    response = get_url(
+        context_uri, headers={"Accept": "application/ld+json, application/json"}
+    )
+    response.raise_for_status()
+    return response.json()["@context"]
+
+
+def inline_remote_contexts(context, base):
+    """
+    replace the remote contexts in a @context value by their content
+    so rdflib does not fetch them itself
+    :param context: the value of a @context, a string, dict or list
+    :param base: the base to resolve relative context uris against
+    :return: the @context value without remote contexts
+    """
+    if isinstance(context, str):
+        return get_remote_context(urljoin(base or "", context))
+    if isinstance(context, list):
+        return [inline_remote_contexts(item, base) for item in context]
+    return context
+
+
+def parse_rdf(graph, data, format, base):
+    """
+    parse rdf data into the graph, remote json-ld contexts are fetched
+    through get_url instead of by the parser
+    :param graph: the rdflib graph to parse into
+    :param data: the rdf data as bytes or string
+    :param format: the rdflib format of the data
+    :param base: the uri to resolve relative uris against
+    """
+    size = len(graph)
+    if format != "json-ld":
+        graph.parse(data=data, format=format, publicID=str(base))
+    else:
+        document = json.loads(data)
+        documents = document if isinstance(document, list) else [document]
+        for item in documents:
+            if isinstance(item, dict) and "@context" in item:
+                item["@context"] = inline_remote_contexts(
+                    item["@context"], str(base)
+                )
+        graph.parse(data=document, format="json-ld", base=str(base))
+    # the triples the data added to the graph
+    Metrics().incr("rdf.triples_parsed", len(graph) - size)
+
+
+# the files the registry is written to, by rdflib serializer format
+REGISTRY_FORMATS = {
+    "turtle": "registry.ttl",
+    "json-ld": "registry.json",
+    "xml": "registry.rdf",
+    "nt": "registry.nt",
+}
+
+
+def resolve_relative(term, base):
+    """
+    :param term: an rdflib term
+    :param base: the uri to resolve relative uris against, None keeps them relative
+    :return: the term with a relative uri made absolute
+    """
+    if base is not None and isinstance(term, URIRef) and ":" not in term:
+        return URIRef(urljoin(base, term))
+    return term
+
+
+# the formats with a compressed .gz side-car when compression is asked for
+COMPRESSED_FORMATS = {
+    "turtle": "registry.ttl.gz",
+    "nt": "registry.nt.gz",
+}
+
+
+def serialize_snapshot(
+    triples, namespaces, format, destination, base=None, compressed_destination=None
+):
+    """
+    serialize a snapshot of a graph to a file, the file is written to a temp file
+    next to the destination and renamed so a half written file is never seen.
+    Turtle, n-triples, json-ld and rdf/xml are streamed in sorted order by utils.rdf_writer,
+    so the same graph always gives the same file, other formats are serialized by rdflib.
+    The blank nodes are relabelled first, so the file does not change with the labels
+    the parser gave them.
+    This runs in a worker process, so it only takes picklable arguments
+    :param triples: list of the triples of the graph
+    :param namespaces: list of (prefix, namespace) pairs to bind
+    :param format: the rdflib serializer format
+    :param destination: the path of the file to write
+    :param base: the base uri, turtle gets it as @base and keeps relative uris (like ./),
+    the other formats get them resolved against it
+    :param compressed_destination: the path of a gzipped copy (turtle and n-triples only)
+    """
+    triples = canonical_bnodes(triples)
+    if format == "turtle":
+        write_turtle(
+            triples,
+            namespaces,
+            destination,
+            base=base,
+            compressed_destination=compressed_destination,
+        )
+        return destination
+    triples = sorted(
+        (tuple(resolve_relative(term, base) for term in triple) for triple in triples),
+        key=sort_key,
+    )
+    if format == "nt":
+        write_ntriples(
+            triples, destination, compressed_destination=compressed_destination
+        )
+        return destination
+    if format == "json-ld":
+        write_jsonld(triples, destination)
+        return destination
+    if format == "xml":
+        write_rdfxml(triples, namespaces, destination)
+        return destination
+    graph = Graph()
+    for prefix, namespace in namespaces:
+        graph.bind(prefix, namespace, override=True, replace=True)
+    for triple in triples:
+        graph.add(triple)
+    with atomic_writer(destination) as f:
+        f.write(graph.serialize(format=format, indent=4))
+    return destination
+
+
+def init_worker(root, log_queue, level):
+    # module level so it can be pickled as the initializer of the worker processes
+    Location(root=root)
+    use_worker_log_queue(log_queue, level)
+
+
+def run_in_processes(function, jobs, workers=None):
+    """
+    call the function for every job in a pool of worker processes,
+    the workers log through the handlers of the build.
+    When a job fails the error is logged and raised again
+    :param function: a module level function, so it can be pickled
+    :param jobs: list of tuples with the arguments of each call
+    :param workers: number of processes, defaults to one per job up to the number of cpus,
+    1 runs the jobs in this process
+    :return: list of the results, in the order of the jobs
+    """
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or len(jobs) <= 1:
+        results = []
+        for job in jobs:
+            with log_job_error(function):
+                results.append(function(*job))
+        return results
+    with worker_log_queue() as (log_queue, level):
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            # the workers need the location of the src folder for the templates
+            initializer=init_worker,
+            initargs=(Location().get_location(), log_queue, level),
+        ) as executor:
+            futures = [executor.submit(function, *job) for job in jobs]
+            results = []
+            for future in futures:
+                with log_job_error(function):
+                    results.append(future.result())
+            return results
+
+
+@contextmanager
+def log_job_error(function):
+    try:
+        yield
+    except Exception as e:
+        logger.error(
+            "Error while running {0}: {1}".format(function.__name__, e)
+        )
+        raise
+
+
+# the metadata fields of a profile and the property they are read from
+PROFILE_METADATA_FIELDS = {
+    "name": URIRef("http://schema.org/name"),
+    "description": URIRef("http://schema.org/description"),
+    "author": URIRef("http://schema.org/author"),
+    "dateCreated": URIRef("http://schema.org/dateCreated"),
+    "dateModified": URIRef("http://schema.org/dateModified"),
+    "version": URIRef("http://schema.org/version"),
+    "license": URIRef("http://schema.org/license"),
+    "keywords": URIRef("http://schema.org/keywords"),
+}
+
+# fields that can have more than one value, these are kept as lists
+MULTI_VALUED_FIELDS = ("author", "keywords")
+
+
+def extract_metadata_batch(graph, subjects, fields=PROFILE_METADATA_FIELDS):
+    """
+    get the metadata of many subjects in one pass over the graph,
+    each property is looked up once in the predicate index
+    instead of once per subject
+    :param graph: the rdflib graph to read from
+    :param subjects: the subjects to get the metadata of
+    :param fields: dict of field name => property to read the field from
+    :return: dict of subject => dict of field name => sorted list of unique values
+    """
+    values = {subject: {field: set() for field in fields} for subject in subjects}
+    for field, property in fields.items():
+        for subject, value in graph.subject_objects(property):
+            if subject in values:
+                values[subject][field].add(value)
+    return {
+        subject: {
+            field: sorted(field_values, key=str)
+            for field, field_values in subject_values.items()
+        }
+        for subject, subject_values in values.items()
+    }
+
+
+def shape_metadata(values, multi_valued=MULTI_VALUED_FIELDS):
+    """
+    turn the value lists of extract_metadata_batch into the metadata of one subject
+    :param values: dict of field name => list of values
+    :param multi_valued: the fields that stay a list
+    :return: dict of field name => value, list of values for the multi valued fields,
+    None when the field has no value
+    """
+    metadata = {}
+    for field, field_values in values.items():
+        if len(field_values) == 0:
+            metadata[field] = None
+        elif field in multi_valued:
+            metadata[field] = field_values
+        else:
+            metadata[field] = field_values[0]
+    return metadata
+
 
 class KnowledgeGraphRegistry:
     def __init__(self, base, knowledgeGraph=None):
@@ -60,35 +344,48 @@ class KnowledgeGraphRegistry:
             )
         )
 
-    def write(self, file_name, format):
+    def addJson(self, json):
+        self.knowledgeGraph.parse(data=json, format="json-ld")
+
+    def writeAll(self, destinations, workers=None, compressed_destinations=None):
+        """
+        write the registry in several formats at once, each format is serialized
+        in its own process from one snapshot of the graph.
+        Every process gets a pickled copy of the snapshot and sorts it,
+        so the memory use grows with the registry times the number of processes.
+        Relative uris are made absolute against the base, except in turtle
+        where the @base is written at the top of the file
+        :param destinations: dict of rdflib format => path of the file to write
+        :param workers: number of processes, defaults to one per format up to the number of cpus,
+        1 serializes in this process
+        :param compressed_destinations: dict of rdflib format => path of the gzipped copy
+        """
         logger.info(
-            msg="Writing Knowledge Graph Registry to file {0}".format(
-                file_name
+            msg="Writing Knowledge Graph Registry as {0}".format(
+                ", ".join(destinations)
             )
         )
+        compressed_destinations = compressed_destinations or {}
         self.knowledgeGraph.bind(
             "schema", "http://schema.org/", override=True, replace=True
         )
-        destinaton = os.path.join(
-            Location().get_location(), "build", file_name
-        )
-        self.knowledgeGraph.serialize(
-            destination=destinaton, format=format, indent=4
-        )
-
-    def addJson(self, json):
-        self.knowledgeGraph.parse(data=json, format="json-ld")
-
-    def toTurtle(self):
-        return self.write(file_name="registry.ttl", format="turtle")
-
-    def toJson(self):
-        return self.write(file_name="registry.json", format="json-ld")
-
-    def toRdf(self):
-        return self.write(file_name="registry.rdf", format="xml")
+        # the snapshot is taken once and shared by all formats
+        triples = list(self.knowledgeGraph)
+        namespaces = list(self.knowledgeGraph.namespaces())
+        jobs = [
+            (
+                triples,
+                namespaces,
+                format,
+                destination,
+                self._base,
+                compressed_destinations.get(format),
+            )
+            for format, destination in destinations.items()
+        ]
+        run_in_processes(serialize_snapshot, jobs, workers)
 
-    def addProfile(self, profile_uri):
+    def addProfile(self, profile_uri, accept=None):
         logger.info(
             msg="Adding profile to the registry {0}".format(profile_uri)
         )
@@ -104,8 +401,17 @@ class KnowledgeGraphRegistry:
         try:
             # first add the uri as rdf type schema:CreativeWork , schema:LisItem
             # self.knowledgeGraph.add((URIRef(profile_uri), RDF.type, URIRef("http://schema.org/CreativeWork")))
-            self.knowledgeGraph.parse(
-                format="json-ld", location=URIRef(profile_uri)
+            # the response is most likely already fetched by the harvester
+            response = get_url(
+                profile_uri,
+                headers={"Accept": accept} if accept is not None else None,
+            )
+            response.raise_for_status()
+            parse_rdf(
+                self.knowledgeGraph,
+                response.content,
+                get_rdf_format(response.headers.get("Content-Type")),
+                base=profile_uri,
             )
             self.knowledgeGraph.add(
                 (
@@ -150,21 +456,23 @@ class KnowledgeGraphRegistry:
         logger.info(
             msg="Extracting metadata from all profiles in the registry"
         )
-        # create a dictionary to store the metadata
-        metadata = {}
         # get all the profiles in the registry
-        profiles = self.knowledgeGraph.objects(
-            BNode("listregistry"), URIRef("http://schema.org/itemListElement")
+        profiles = list(
+            self.knowledgeGraph.objects(
+                BNode("listregistry"),
+                URIRef("http://schema.org/itemListElement"),
+            )
         )
-        # iterate over all the profiles
+        # read the metadata of all the profiles in one pass
+        values = extract_metadata_batch(self.knowledgeGraph, profiles)
+        metadata = {}
         for profile in profiles:
-            # get the metadata from the profile
-            metadata[profile] = self.getMetadata(profile)
+            metadata[profile] = shape_metadata(values[profile])
+            metadata[profile]["url"] = profile
         # log json metadata in pprint format
         logger.debug(
-            msg="Metadata extracted from all profiles in the registry: \n{0}".format(
-                json.dumps(metadata, indent=4)
-            )
+            "Metadata extracted from all profiles in the registry: \n%s",
+            lazy(json.dumps, metadata, indent=4),
         )
         return metadata
 
@@ -175,76 +483,14 @@ class KnowledgeGraphRegistry:
         logger.info(
             msg="Extracting metadata from profile {0}".format(profile_uri)
         )
-        # create a dictionary to store the metadata
-        metadata = {}
-        # get the name of the profile
-        metadata["name"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/name")
-        )
-        # get the description of the profile
-        metadata["description"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/description")
-        )
-        # get the authors of the profile, this can be a list of authors or a single author
-        all_authors = self.knowledgeGraph.query(
-            """SELECT ?authors WHERE {
-            <%s> <http://schema.org/author> ?authors .
-        }"""
-            % profile_uri
-        )
-        # if there is more than one author
-        if len(all_authors) > 1:
-            # create a list to store the authors
-            authorse = []
-            # iterate over all the authors
-            for row in all_authors:
-                # add the author to the list
-                authorse.append(row.authors)
-            # add the list of authors to the metadata
-            metadata["author"] = authorse
-        else:
-            metadata["author"] = self.knowledgeGraph.value(
-                profile_uri, URIRef("http://schema.org/author")
-            )
-        # get the dateCreated of the profile
-        metadata["dateCreated"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/dateCreated")
-        )
-        # get the dateModified of the profile
-        metadata["dateModified"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/dateModified")
-        )
-        # get the version of the profile
-        metadata["version"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/version")
-        )
-        # get the license of the profile
-        metadata["license"] = self.knowledgeGraph.value(
-            profile_uri, URIRef("http://schema.org/license")
-        )
-        # get the keywords of the profile this can be a list of keywords or a single keyword
-        # perform sparql query to get all the keywords
-        all_keywords = self.knowledgeGraph.query(
-            """SELECT ?keywords WHERE {
-            <%s> <http://schema.org/keywords> ?keywords .
-        }"""
-            % profile_uri
-        )
-        metadata["keywords"] = []
-        if len(all_keywords) > 1:
-            # iterate over all the keywords
-            for keyworde in all_keywords:
-                metadata["keywords"].append(keyworde.keywords)
-            # get the url of the profile
-            metadata["url"] = profile_uri
-        else:
-            metadata["keywords"] = self.knowledgeGraph.value(
-                profile_uri, URIRef("http://schema.org/keywords")
-            )
+        profile_uri = URIRef(profile_uri)
+        values = extract_metadata_batch(self.knowledgeGraph, [profile_uri])
+        metadata = shape_metadata(values[profile_uri])
+        metadata["url"] = profile_uri
         # log json metadata in pprint format
         logger.debug(
-            msg="Metadata extracted from profile {0}: \n{1}".format(
-                profile_uri, json.dumps(metadata, indent=4)
-            )
+            "Metadata extracted from profile %s: \n%s",
+            profile_uri,
+            lazy(json.dumps, metadata, indent=4),
         )
         return metadata
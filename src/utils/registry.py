@@ -1,24 +1,105 @@
 # this file will contain all the functions that will be used to build the registry that will be used to build the gh-pages
 import os
 import csv
+from fnmatch import fnmatch
 import json
+import hashlib
+import time
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from utils.singleton.location import Location
-from utils.singleton.logger import get_logger
-from utils.uri_checks import get_url, check_uri
+from utils.singleton.logger import get_logger, lazy
+from utils.uri_checks import get_url, check_uri, normalize_uri
 from utils.jsonld_file import (
     get_metadata_profile,
 )
-from utils.html_build_util import make_html_file, setup_build_folder, addBaseToRegistry
-from utils.rdflib_utils import KnowledgeGraphRegistry
+from utils.html_build_util import (
+    write_html_file,
+    paginate,
+    setup_build_folder,
+)
+from utils.rdflib_utils import (
+    KnowledgeGraphRegistry,
+    run_in_processes,
+    REGISTRY_FORMATS,
+    COMPRESSED_FORMATS,
+)
 from utils.contact import Contact
-from utils.profileharvester import ProfileHarvester
+from utils.profileharvester import get_entry_accept
+from utils.crawler import Crawler
+from utils.singleton.metrics import Metrics
+from utils.singleton.profiler import (
+    Profiler,
+    BUILD_PHASE,
+    CPU_PROFILE_FILE,
+    CPU_REPORT_FILE,
+    MEMORY_REPORT_FILE,
+)
+from utils.singleton.response_store import ResponseStore
+from utils.build_manifest import BuildManifest, file_hash
+from utils.profile_pages import (
+    PROFILE_PAGE_FILES,
+    profile_folder,
+    page_source,
+    write_profile_page,
+)
+from utils.search_index import (
+    SEARCH_FOLDER,
+    build_search_index,
+    dump as dump_search_file,
+)
+from utils.rdf_writer import canonical_bnodes
+from rdflib import URIRef
 
 logger = get_logger()
 
+# folders in the data folder that never hold registry csv files
+SKIPPED_FOLDERS = {".git", "node_modules"}
+
+# the file in the build folder with the timings and counters of the last build
+METRICS_FILE = "metrics.json"
+
+# the phases of the build, in the order they run
+PHASES = ["discovery", "check", "harvest", "serialise", "extract", "render"]
+
 # registry class that will hold the registry
 class Registry:
-    def __init__(self, data_path, registry=None, base=None):
+    def __init__(
+        self,
+        data_path,
+        registry=None,
+        base=None,
+        workers=1,
+        negotiate=True,
+        max_depth=None,
+        sparql_detection=False,
+        page_size=0,
+        incremental=False,
+        serialize_workers=None,
+        compress=False,
+        csv_include=None,
+        csv_ignore=None,
+    ):
         self.registry = registry
+        self.page_size = page_size  # profiles per index page, 0 puts all profiles on index.html
+        self.incremental = incremental  # keep the build folder and only write the outputs that changed
+        self.build_manifest = None
+        self.profile_pages = {}
+        self.profile_metadate_dicts = {}
+        self.serialize_workers = serialize_workers  # processes writing the registry formats and profile pages, None is one per cpu
+        self.compress = compress  # also write registry.ttl.gz and registry.nt.gz
+        self.csv_include = csv_include or []  # globs of the csv files to use, all csv files if empty
+        self.csv_ignore = csv_ignore or []  # globs of the folders and csv files to skip
+        self.csv_files = []
+        self.workers = workers
+        self.negotiate = negotiate
+        self.max_depth = max_depth
+        self.crawler = Crawler(
+            negotiate=negotiate,
+            max_depth=max_depth,
+            workers=workers,
+            sparql_detection=sparql_detection,
+        )
         self.entry_errors = []
         self.entry_warnings = []
         self.to_check_rows = []
@@ -40,7 +121,40 @@ class Registry:
         report["to_check_rows"] = self.to_check_rows
         report["checked_rows"] = self.checked_rows
         report["profile_registry_array"] = self.profile_registry_array
+        report["counters"] = Metrics().get_counters()
+        report["http_cache"] = {
+            "hits": Metrics().get("http_cache.hits"),
+            "misses": Metrics().get("http_cache.misses"),
+            "revalidations": Metrics().get("http_cache.revalidations"),
+        }
         logger.debug(report["to_check_rows"])
+        logger.info(
+            "Content negotiation saved {0} requests and needed {1} extra requests".format(
+                Metrics().get("negotiation.requests_saved"),
+                Metrics().get("negotiation.extra_requests"),
+            )
+        )
+        logger.info("Http cache statistics: {0}".format(report["http_cache"]))
+        report["build"] = {
+            "incremental": self.incremental,
+            "outputs_written": Metrics().get("build.outputs_written"),
+            "outputs_unchanged": Metrics().get("build.outputs_unchanged"),
+            "outputs_removed": Metrics().get("build.outputs_removed"),
+        }
+        logger.info("Build statistics: {0}".format(report["build"]))
+        report["csv"] = {
+            "files": len(self.csv_files),
+            "read": Metrics().get("csv.read"),
+            "unchanged": Metrics().get("csv.unchanged"),
+        }
+        logger.info("Csv statistics: {0}".format(report["csv"]))
+        report["crawl"] = {
+            "harvested": len(self.crawler.harvesters),
+            "deduplicated": Metrics().get("crawl.deduplicated"),
+            "depth_limited": Metrics().get("crawl.depth_limited"),
+        }
+        logger.info("Crawl statistics: {0}".format(report["crawl"]))
+        report["timings"] = Metrics().get_timings()
         return report
 
     def get_registry(self):
@@ -54,67 +168,238 @@ class Registry:
         """
 
         logger.info("Building registry")
-        # function here to detect all the csv files in the data_path including subfolders
-        self.csv_files = self.detect_csv_files()
-        logger.info(f"Found {len(self.csv_files)} csv files")
-        # function that will go over all the csv files and return an array of dictionaries with each entry in the array being {"source": "relative path to csv file", "URI": "URI of a given profile", "contact":"contact" }
-        self.registry_array = self.make_entries_array()
-        self.entries_array_check()
-        self.entries_harvestor()
+        start = time.perf_counter()
+        try:
+            with Profiler().phase(BUILD_PHASE):
+                self.build_phases()
+        finally:
+            self.write_metrics(time.perf_counter() - start)
+            Profiler().write(os.path.join(Location().get_location(), "build"))
+
+    @contextmanager
+    def phase(self, name):
+        """
+        time the with block as a phase of the build in the Metrics,
+        and profile it when the Profiler is set up for the phase
+        :param name: the name of the phase
+        """
+        with Metrics().phase(name), Profiler().phase(name):
+            yield
+
+    def build_phases(self):
+        """
+        run the phases of the build, each phase is timed in the Metrics
+        """
+        # an incremental build starts from the manifest of the last build
+        self.build_manifest = BuildManifest(
+            os.path.join(Location().get_location(), "build"),
+            load=self.incremental,
+        )
+        with self.phase("discovery"):
+            # function here to detect all the csv files in the data_path including subfolders
+            self.csv_files = self.detect_csv_files()
+            logger.info(f"Found {len(self.csv_files)} csv files")
+            # function that will go over all the csv files and return an array of dictionaries with each entry in the array being {"source": "relative path to csv file", "URI": "URI of a given profile", "contact":"contact" }
+            self.registry_array = self.make_entries_array()
+        with self.phase("check"):
+            self.entries_array_check()
+        with self.phase("harvest"):
+            self.entries_harvestor()
         # self.get_metadata_profiles()
-        setup_build_folder()
-        self.knowledge_graph_registry.toTurtle()
-        # write the knowledge graph to a ttl file
-        self.registry_json_format = (
-            self.knowledge_graph_registry.extractMetadata()
+        # an incremental build keeps the build folder and its manifest
+        setup_build_folder(clean=not self.incremental)
+        self.build_manifest.set_inputs(self.inputs_hash())
+        if self.incremental and self.build_manifest.unchanged():
+            logger.info(
+                "Inputs did not change since the last build, keeping the outputs"
+            )
+            self.build_manifest.keep_outputs()
+            self.build_manifest.save()
+            return
+        with self.phase("serialise"):
+            # write the knowledge graph in all the formats
+            self.write_registry_files()
+        with self.phase("extract"):
+            self.registry_json_format = (
+                self.knowledge_graph_registry.extractMetadata()
+            )
+        with self.phase("render"):
+            self.make_profile_pages()
+            self.make_search_index()
+            self.make_html_file_registry()
+        # the metrics and profile reports are written after the build
+        self.build_manifest.remove_stale(
+            keep={METRICS_FILE, CPU_PROFILE_FILE, CPU_REPORT_FILE, MEMORY_REPORT_FILE}
         )
-        self.make_html_file_registry()
-        addBaseToRegistry(self.knowledge_graph_registry._base)
+        self.build_manifest.save()
+
+    def write_metrics(self, seconds):
+        """
+        write the phase timings and the counters of the build to build/METRICS_FILE
+        and summarise them in the log
+        :param seconds: the wall time of the whole build
+        """
+        metrics = Metrics()
+        build_folder = os.path.join(Location().get_location(), "build")
+        summary = {
+            "seconds": round(seconds, 6),
+            "http_requests": metrics.get("http.requests"),
+            "http_bytes": metrics.get("http.bytes"),
+            # responses the on-disk http cache (--cache-dir) answered with a 304
+            "http_cache_hits": metrics.get("http_cache.hits"),
+            # responses fetched earlier in this build that were used again
+            "responses_reused": metrics.get("response_store.hits"),
+            "triples_parsed": metrics.get("rdf.triples_parsed"),
+            "profiles_found": len(self.profile_metadate_dicts),
+            "pages_rendered": metrics.get("pages.rendered"),
+        }
+        for phase, phase_seconds in metrics.get_timings().items():
+            logger.info("Phase {0} took {1:.3f}s".format(phase, phase_seconds))
+        logger.info("Build summary: {0}".format(summary))
+        try:
+            os.makedirs(build_folder, exist_ok=True)
+            metrics.write(os.path.join(build_folder, METRICS_FILE), summary=summary)
+        except OSError as e:
+            logger.error(f"Error while writing {METRICS_FILE}: {e}")
+
+    def write_registry_files(self):
+        """
+        write the knowledge graph of the registry in all REGISTRY_FORMATS,
+        and the .gz side-cars of COMPRESSED_FORMATS when self.compress is set,
+        the formats are serialized in parallel processes
+        """
+        with ExitStack() as stack:
+            destinations = {
+                format: stack.enter_context(self.build_manifest.output(file_name))
+                for format, file_name in REGISTRY_FORMATS.items()
+            }
+            compressed_destinations = {}
+            if self.compress:
+                compressed_destinations = {
+                    format: stack.enter_context(
+                        self.build_manifest.output(file_name)
+                    )
+                    for format, file_name in COMPRESSED_FORMATS.items()
+                }
+            self.knowledge_graph_registry.writeAll(
+                destinations,
+                workers=self.serialize_workers,
+                compressed_destinations=compressed_destinations,
+            )
+
+    def inputs_hash(self):
+        """
+        hash everything the outputs are made from: the csv rows, the fetched
+        bodies, the templates and the build options
+        :return: the sha256 hex digest of the inputs
+        """
+        hasher = hashlib.sha256()
+        for entry in self.registry_array:
+            hasher.update(
+                "{0}\n{1}\n{2}\n".format(
+                    os.path.relpath(entry["source"], self.data_path),
+                    entry["URI"],
+                    entry["contact"].get_contact(),
+                ).encode("utf-8")
+            )
+        ResponseStore().digest(hasher)
+        hasher.update(self.templates_hash().encode("utf-8"))
+        options = {
+            "base": self.knowledge_graph_registry._base,
+            "page_size": self.page_size,
+            "compress": self.compress,
+        }
+        hasher.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def templates_hash(self):
+        """
+        :return: the sha256 hex digest of the names and contents of the templates
+        """
+        hasher = hashlib.sha256()
+        templates_folder = os.path.join(Location().get_location(), "templates")
+        for template in sorted(os.listdir(templates_folder)):
+            hasher.update(template.encode("utf-8"))
+            hasher.update(
+                file_hash(os.path.join(templates_folder, template)).encode("utf-8")
+            )
+        return hasher.hexdigest()
 
     def detect_csv_files(self):
         """
-        this function will detect all the csv files in the data_path including subfolders
-        :param data_path: the path to the data folder
+        this function will detect all the csv files in the data_path including subfolders,
+        SKIPPED_FOLDERS and the folders and files matching self.csv_ignore are not walked,
+        when self.csv_include is set only the csv files matching it are kept
         :return: the list of csv files
         """
         logger.info("Detecting csv files")
         csv_files = []
         for root, dirs, files in os.walk(self.data_path):
-            for file in files:
-                if file.endswith(".csv"):
-                    csv_files.append(os.path.join(root, file))
+            # os.walk does not go into the folders that are removed from dirs
+            dirs[:] = sorted(
+                folder
+                for folder in dirs
+                if folder not in SKIPPED_FOLDERS
+                and not self.csv_ignored(self.data_relpath(root, folder))
+            )
+            for file in sorted(files):
+                if not file.endswith(".csv"):
+                    continue
+                relative = self.data_relpath(root, file)
+                if self.csv_ignored(relative):
+                    continue
+                if self.csv_include and not any(
+                    fnmatch(relative, pattern) for pattern in self.csv_include
+                ):
+                    continue
+                csv_files.append(os.path.join(root, file))
         return csv_files
 
+    def data_relpath(self, root, name):
+        # the path relative to the data folder, with / as separator for the globs
+        return os.path.relpath(os.path.join(root, name), self.data_path).replace(
+            os.sep, "/"
+        )
+
+    def csv_ignored(self, relative):
+        return any(fnmatch(relative, pattern) for pattern in self.csv_ignore)
+
     def entries_harvestor(self):
         """
-        This function will make a harvestor class for each entry in the registry_array.
+        This function will add each entry in the registry_array to the crawler and crawl them.
+        The harvests run concurrently when self.workers > 1,
+        the results are collected in the order of the registry_array.
         """
         logger.info("Making harvestors")
         self.profile_metadate_dicts = {}
+        self.profile_uris = {}  # key in profile_metadate_dicts => uri of the profile in the registry graph
         for entry in self.to_check_rows:
             logger.info(f"Making harvestor for {entry['URI']}")
-            entry_harvestor = ProfileHarvester(entry["URI"])
-            entry_harvestor.harvest()
-            entry["harvestor"] = entry_harvestor
-            logger.debug(entry_harvestor.get_kg())
+            entry["harvestor"] = self.crawler.add_entry(entry["URI"])
+        self.crawler.crawl()
+        for entry in self.to_check_rows:
+            logger.debug("%s", lazy(self.crawler.get_kg, entry["URI"]))
             logger.info(f"Harvestor for {entry['URI']} has run")
             logger.info(
-                f"Harvester has found {len(entry_harvestor.getProfiles())} profiles"
+                f"Harvester has found {len(self.crawler.getProfiles(entry['URI']))} profiles"
             )
             logger.debug(
-                entry_harvestor.getCompleteKG()
-                .serialize(
-                    format="turtle", base=entry["URI"], encoding="utf-8"
-                )
-                .decode("utf-8")
+                "%s",
+                lazy(
+                    self.crawler.getCompleteKG(entry["URI"]).serialize,
+                    format="turtle",
+                    base=entry["URI"],
+                ),
             )
             logger.info(f"Harvestor for {entry['URI']} has run")
-            harvested_info = entry_harvestor.getListDictsProfiles()
+            harvested_info = self.crawler.getListDictsProfiles(entry["URI"])
 
             # for profile_uri , info in harvested_info.items(): => self.KnowledgeGraphRegistry.addProfile(profile_uri)
             to_add_harvested_info = {}
             for profile_uri, info in harvested_info.items():
-                self.knowledge_graph_registry.addProfile(profile_uri)
+                self.knowledge_graph_registry.addProfile(
+                    profile_uri, accept=get_entry_accept(self.negotiate)
+                )
 
                 # check if profile_uri / last part has a "." in it to check if its a file , if so then make new uri that is the same but without the file extension
                 if profile_uri.split("/")[-1].find(".") != -1:
@@ -124,9 +409,10 @@ class Registry:
                     new_profile_uri = profile_uri
 
                 to_add_harvested_info[new_profile_uri] = info
+                self.profile_uris[new_profile_uri] = profile_uri
 
             # ppritn the harvested info
-            logger.info(json.dumps(to_add_harvested_info, indent=4))
+            logger.debug("%s", lazy(json.dumps, to_add_harvested_info, indent=4))
             self.profile_metadate_dicts.update(to_add_harvested_info)
 
     def make_entries_array(self):
@@ -141,51 +427,104 @@ class Registry:
         registry_array = []
         try:
             for csv_file in self.csv_files:
-                logger.info(f"Reading csv file {csv_file}")
-                with open(csv_file, newline="") as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        registry_array.append(
-                            {
-                                "source": csv_file,
-                                "URI": row["URI"],
-                                "contact": Contact(row["contact"]),
-                            }
-                        )
+                for row in self.read_csv_rows(csv_file):
+                    registry_array.append(
+                        {
+                            "source": csv_file,
+                            "URI": row["URI"],
+                            "contact": Contact(row["contact"]),
+                        }
+                    )
         except Exception as e:
             logger.error(f"Error while making registry array: {e}")
         return registry_array
 
+    def read_csv_rows(self, csv_file):
+        """
+        read the URI and contact of the rows of a csv file, in an incremental build
+        the rows of the last build are used when the mtime and size of the file did not change
+        :param csv_file: the path of the csv file
+        :return: list of dicts with the URI and contact of each row
+        """
+        name = os.path.relpath(csv_file, self.data_path)
+        stat = os.stat(csv_file)
+        rows = self.build_manifest.csv_rows(name, stat)
+        if rows is not None:
+            logger.info(f"Csv file {csv_file} did not change")
+            Metrics().incr("csv.unchanged")
+            return rows
+        logger.info(f"Reading csv file {csv_file}")
+        Metrics().incr("csv.read")
+        with open(csv_file, newline="") as csvfile:
+            rows = [
+                {"URI": row["URI"], "contact": row["contact"]}
+                for row in csv.DictReader(csvfile)
+            ]
+        self.build_manifest.set_csv_rows(name, stat, rows)
+        return rows
+
     def entries_array_check(self):
         """
-        this function will make the registry
-        :param registry_array: the array of dictionaries
-        :return: the registry
+        this function will make the registry: rows with a valid contact are
+        grouped on their normalised uri and checked concurrently, the first row
+        of each uri is checked first and when its check fails the next row of
+        the same uri is checked, so a failing variant never hides a valid one.
+        The first row that passes is kept, the later rows of its uri are duplicates
         """
         logger.info("Checking registry array")
+        variants = {}  # normalised uri => the entries with that uri, in row order
         for entry in self.registry_array:
             # first check if the contact is valid
-            good = True
             logger.debug(f"Checking contact {entry['contact'].get_contact()}")
             if not entry["contact"].result():
                 self.entry_warning(entry, reason="Contact is not valid")
-                good = False
+                continue
             logger.info(f"Checking entry {entry}")
-            # check if the URI is valid
-            # check if the URI is already in the registry
-            for row in self.to_check_rows:
-                if entry["URI"] == row["URI"]:
-                    self.entry_warning(
-                        entry, reason="URI is already in registry"
-                    )
-                    good = False
-                    break
-            if not check_uri(entry["URI"]):
-                self.entry_failed(entry, reason="URI is not valid")
-                good = False
-            # check if the URI return a valid json-ld
-            if good:
-                self.to_check_rows.append(entry)
+            variants.setdefault(normalize_uri(entry["URI"]), []).append(entry)
+        # check with the Accept of the harvester so the harvester reuses the response
+        headers = {"Accept": get_entry_accept(self.negotiate)}
+        kept = {}  # normalised uri => the entry that passed
+        position = {key: 0 for key in variants}  # index of the next variant to check
+        with ExitStack() as stack:
+            # with 1 worker the uris are checked one by one in this thread
+            check_all = map
+            if self.workers > 1:
+                check_all = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=self.workers)
+                ).map
+            pending = list(variants)
+            while len(pending) > 0:
+                entries = [variants[key][position[key]] for key in pending]
+                results = check_all(
+                    lambda entry: check_uri(entry["URI"], headers=headers),
+                    entries,
+                )
+                retry = []
+                for key, entry, valid in zip(pending, entries, results):
+                    position[key] += 1
+                    if valid:
+                        kept[key] = entry
+                        continue
+                    self.entry_failed(entry, reason="URI is not valid")
+                    if position[key] < len(variants[key]):
+                        # try the next row with the same uri
+                        retry.append(key)
+                pending = retry
+        for key, entries in variants.items():
+            for entry in entries[position[key] :]:
+                # the uri is already in the registry, also as another variant of the same uri
+                self.entry_warning(
+                    entry,
+                    reason="URI is already in registry as {0}".format(
+                        kept[key]["URI"]
+                    ),
+                )
+                Metrics().incr("entries.duplicates")
+        # keep the rows in the order of the csv files
+        order = {id(entry): index for index, entry in enumerate(self.registry_array)}
+        self.to_check_rows.extend(
+            sorted(kept.values(), key=lambda entry: order[id(entry)])
+        )
 
     def get_metadata_profiles(self):
         logger.info("Getting metadata profiles")
@@ -199,28 +538,130 @@ class Registry:
                 logger.exception(e)
                 continue
 
+    def make_profile_pages(self):
+        """
+        write a folder per profile with a landing page and the subgraph of
+        the profile in turtle and json-ld, the pages are written in parallel processes.
+        An incremental build keeps the pages whose subgraph, metadata and templates did not change
+        """
+        logger.info("Making {0} profile pages".format(len(self.profile_uris)))
+        knowledge_graph = self.knowledge_graph_registry.knowledgeGraph
+        namespaces = list(knowledge_graph.namespaces())
+        templates = self.templates_hash()
+        self.profile_pages = {}  # key in profile_metadate_dicts => folder of its page
+        with ExitStack() as stack:
+            jobs = []
+            for key, profile_uri in self.profile_uris.items():
+                folder = profile_folder(profile_uri)
+                self.profile_pages[key] = folder
+                # the concise bounded description: the triples of the profile and its blank nodes
+                triples = canonical_bnodes(knowledge_graph.cbd(URIRef(profile_uri)))
+                source = page_source(
+                    key,
+                    self.profile_metadate_dicts[key],
+                    triples,
+                    namespaces,
+                    templates,
+                )
+                names = {
+                    kind: folder + file_name
+                    for kind, file_name in PROFILE_PAGE_FILES.items()
+                }
+                if self.build_manifest.keep_unchanged(names.values(), source):
+                    continue
+                destinations = {
+                    kind: stack.enter_context(
+                        self.build_manifest.output(name, source=source)
+                    )
+                    for kind, name in names.items()
+                }
+                jobs.append(
+                    (
+                        profile_uri,
+                        key,
+                        self.profile_metadate_dicts[key],
+                        triples,
+                        namespaces,
+                        destinations,
+                    )
+                )
+            run_in_processes(write_profile_page, jobs, self.serialize_workers)
+        logger.info(
+            "Kept {0} unchanged profile pages".format(len(self.profile_uris) - len(jobs))
+        )
+        Metrics().incr("pages.rendered", len(jobs))
+
+    def make_search_index(self):
+        """
+        write the sharded search index of the profiles that the registry page queries
+        """
+        files = build_search_index(self.profile_metadate_dicts, self.profile_pages)
+        logger.info("Writing search index in {0} files".format(len(files)))
+        for file_name, content in files.items():
+            with self.build_manifest.output(
+                SEARCH_FOLDER + "/" + file_name
+            ) as destination:
+                with open(destination, "w", encoding="utf-8") as f:
+                    dump_search_file(content, f)
+
     def make_html_file_registry(self):
+        """
+        write the index of the registry to the build folder,
+        split over pages of self.page_size profiles with a pages.json manifest
+        """
         logger.info("Making html file")
-        logger.info(json.dumps(self.profile_metadate_dicts, indent=4))
-        
+        logger.debug(
+            "%s", lazy(json.dumps, self.profile_metadate_dicts, indent=4)
+        )
         try:
-            kwargs = {
-                "title": "Test Profile registry",
-                "description": "This is a test profile registry",
-                "theme": "main",
-                "datasets": self.profile_metadate_dicts,
+            pages = paginate(
+                list(self.profile_metadate_dicts.items()), self.page_size
+            )
+            links = [
+                {"number": page["number"], "file": page["file"]}
+                for page in pages
+            ]
+            for index, page in enumerate(pages):
+                kwargs = {
+                    "title": "Test Profile registry",
+                    "description": "This is a test profile registry",
+                    "theme": "main",
+                    "datasets": dict(page["items"]),
+                    "profile_pages": self.profile_pages,
+                    "pages": links,
+                    "current_page": page["number"],
+                    "previous_page": links[index - 1] if index > 0 else None,
+                    "next_page": links[index + 1] if index + 1 < len(links) else None,
+                }
+                # the page is streamed to the build folder
+                with self.build_manifest.output(page["file"]) as destination:
+                    write_html_file(
+                        "index_registry.html", destination, **kwargs
+                    )
+                Metrics().incr("pages.rendered")
+            manifest = {
+                "page_size": self.page_size,
+                "profiles": len(self.profile_metadate_dicts),
+                "pages": [
+                    {
+                        "number": page["number"],
+                        "file": page["file"],
+                        "profiles": len(page["items"]),
+                    }
+                    for page in pages
+                ],
             }
-            html_file = make_html_file("index_registry.html", **kwargs)
-            # write the html file to the build folder
-            with open(
-                os.path.join(Location().get_location(), "build", "index.html"),
-                "w",
-            ) as f:
-                f.write(html_file)
+            with self.build_manifest.output("pages.json") as destination:
+                with open(destination, "w") as f:
+                    json.dump(manifest, f, indent=4)
+            logger.info(
+                "Registry index written to {0} page(s)".format(len(pages))
+            )
         except Exception as e:
+            # the registry can not be published without its index
             logger.error(f"Error while making html file: {e}")
             logger.exception(e)
-            return False
+            raise
 
     def entry_warning(self, entry, reason):
         uri = entry["URI"]
@@ -0,0 +1,81 @@
+# this file will contain the functions that build the search index of the registry page
+# the index is an inverted index of the tokens of the name, description, keywords and authors
+# of the profiles, split in small json shards so the page only loads the shards a search needs
+
+import re
+import json
+import unicodedata
+
+# the folder in the build folder that holds the search index
+SEARCH_FOLDER = "search"
+
+# the metadata fields that are searched
+SEARCH_FIELDS = ("name", "description", "keywords", "authors")
+
+# tokens are put in the shard of their first PREFIX_LENGTH characters
+PREFIX_LENGTH = 2
+
+# number of profiles per shard of the profile list
+DOCS_PER_SHARD = 1000
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    split a text in lowercase ascii tokens of at least PREFIX_LENGTH characters
+    :param text: the text to split
+    :return: list of the tokens
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
+    return [token for token in TOKEN.findall(text) if len(token) >= PREFIX_LENGTH]
+
+
+def build_search_index(profiles, profile_pages=None):
+    """
+    build the sharded search index of the profiles
+    :param profiles: dict of profile url => metadata, as profile_metadate_dicts
+    :param profile_pages: dict of profile url => folder of the page of the profile
+    :return: dict of file name (relative to the search folder) => json content
+    """
+    profile_pages = profile_pages or {}
+    terms = {}  # shard prefix => token => list of profile ids
+    docs = []
+    for profile_id, (url, metadata) in enumerate(profiles.items()):
+        docs.append(
+            [str(metadata.get("name") or url), str(url), profile_pages.get(url)]
+        )
+        tokens = set()
+        for field in SEARCH_FIELDS:
+            value = metadata.get(field)
+            if value is None:
+                continue
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                tokens.update(tokenize(item))
+        for token in tokens:
+            shard = terms.setdefault(token[:PREFIX_LENGTH], {})
+            shard.setdefault(token, []).append(profile_id)
+    files = {}
+    for prefix, shard in terms.items():
+        files["terms-{0}.json".format(prefix)] = {
+            token: shard[token] for token in sorted(shard)
+        }
+    for start in range(0, len(docs), DOCS_PER_SHARD):
+        files["docs-{0}.json".format(start // DOCS_PER_SHARD)] = docs[
+            start : start + DOCS_PER_SHARD
+        ]
+    files["index.json"] = {
+        "profiles": len(docs),
+        "fields": list(SEARCH_FIELDS),
+        "prefix_length": PREFIX_LENGTH,
+        "docs_per_shard": DOCS_PER_SHARD,
+        "term_shards": sorted(terms),
+    }
+    return files
+
+
+def dump(content, f):
+    # compact json, the shards are downloaded by the page
+    json.dump(content, f, separators=(",", ":"), ensure_ascii=False)
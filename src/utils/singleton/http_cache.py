@@ -0,0 +1,115 @@
+# this file contains a singleton class that will hold the on-disk http cache
+# responses are stored per uri + Accept header together with their ETag/Last-Modified
+# so that later builds can send conditional requests and reuse the body on a 304
+# the cache directory is kept outside of the build folder so the action can restore it between runs
+
+import os
+import json
+import hashlib
+import tempfile
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from utils.singleton.location import singleton
+
+# headers that are kept with the cached body
+CACHED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Link"]
+
+
+@singleton
+class HttpCache:
+    def __init__(self, directory=None):
+        """
+        :param directory: the folder to keep the cache in, None disables the cache
+        """
+        self.directory = directory
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"HttpCache(directory={self.directory})"
+
+    def enabled(self):
+        return self.directory is not None
+
+    def path(self, uri, accept):
+        key = hashlib.sha256(
+            "{0}\n{1}".format(uri, accept or "").encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".cache")
+
+    def load(self, uri, accept):
+        """
+        get the cached entry of the uri + accept header
+        :return: dict with the stored headers, url and body or None if not cached
+        """
+        if not self.enabled():
+            return None
+        try:
+            with open(self.path(uri, accept), "rb") as f:
+                meta = json.loads(f.readline())
+                meta["body"] = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def store(self, uri, accept, response):
+        """
+        store the response if it can be revalidated later on
+        :return: True if the response was stored
+        """
+        if not self.enabled() or response.status_code != 200:
+            return False
+        if (
+            "ETag" not in response.headers
+            and "Last-Modified" not in response.headers
+        ):
+            return False
+        meta = {
+            "uri": str(uri),
+            "accept": accept,
+            "url": response.url,
+            "headers": {
+                header: response.headers[header]
+                for header in CACHED_HEADERS
+                if header in response.headers
+            },
+        }
+        path = self.path(uri, accept)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file and rename so a concurrent reader never sees half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            f.write(response.content)
+        os.replace(tmp_path, path)
+        return True
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        :param entry: a cached entry as returned by load
+        :return: the headers to make the request conditional
+        """
+        headers = {}
+        if "ETag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    @staticmethod
+    def to_response(entry):
+        """
+        make a 200 response out of a cached entry
+        :param entry: a cached entry as returned by load
+        :return: requests.Response with the cached body
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        return response
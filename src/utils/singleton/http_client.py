@@ -0,0 +1,50 @@
+# this file contains a singleton class that will hold the http session of the build
+# all requests share one pooled keep-alive session, so connections (and their TLS handshake)
+# to the same host are reused instead of opened again for every request
+
+import requests
+from requests.adapters import HTTPAdapter
+from utils.singleton.location import singleton
+from utils.singleton.metrics import Metrics
+
+
+@singleton
+class HttpClient:
+    def __init__(
+        self,
+        pool_connections=10,
+        pool_maxsize=10,
+        connect_timeout=10.0,
+        read_timeout=30.0,
+    ):
+        """
+        :param pool_connections: number of hosts to keep a connection pool for
+        :param pool_maxsize: number of connections kept open per host
+        :param connect_timeout: seconds to wait for a connection to be made
+        :param read_timeout: seconds to wait for the server to send data
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __repr__(self) -> str:
+        return f"HttpClient(timeout={self.timeout})"
+
+    def get(self, uri, headers=None):
+        """
+        do a GET request over the shared session
+        :param uri: the uri to get
+        :param headers: the headers to send with the request
+        :return: the response
+        """
+        response = self.session.get(str(uri), headers=headers, timeout=self.timeout)
+        Metrics().incr("http.requests")
+        Metrics().incr("http.bytes", len(response.content))
+        return response
+
+    def close(self):
+        self.session.close()
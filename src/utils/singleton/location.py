@@ -1,6 +1,11 @@
 # this file contains a singleton class that will hold the location of src folder
 # this is used to make sure that the location of src folder is only set once
 
+import threading
+
+# guards the creation of all singletons, reentrant because a singleton can create another one in its __init__
+_creation_lock = threading.RLock()
+
 
 def singleton(class_):
     instances = {}
@@ -8,7 +13,11 @@ def singleton(class_):
     def getinstance(*args, **kwargs):
         # log.debug(f"getting instance of {class_}with args == {args} && kwargs == {kwargs}")
         if class_ not in instances:
-            instances[class_] = class_(*args, **kwargs)
+            # threads that ask for a singleton that is not made yet all wait
+            # here, so only one of them creates it
+            with _creation_lock:
+                if class_ not in instances:
+                    instances[class_] = class_(*args, **kwargs)
         return instances[class_]
 
     return getinstance
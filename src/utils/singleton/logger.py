@@ -1,29 +1,143 @@
+import atexit
 import logging
-import inspect
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
 from utils.singleton.location import Location
 
+FORMAT = "%(asctime)s - %(levelname)s - %(name)s  - %(message)s"
+
+
+class SingletonLogger:
+    """
+    holds the one handler pipeline that all loggers of the build share.
+    Loggers only put their records on a queue, a single listener thread
+    writes them to the console and to logs.log so worker threads never
+    contend on the file
+    """
 
-class SingletonLogger(logging.Logger):
     _instance = None
-    __initialized = False
-
-    def __init__(self, name=None, level=logging.DEBUG):
-        if not self.__initialized:
-            self.__initialized = True
-            super().__init__(name=name, level=level)
-            console_handler = logging.StreamHandler()
-            console_handler.setLevel(level)
-            formatter = logging.Formatter(
-                "%(asctime)s - %(levelname)s - %(name)s  - %(message)s"
-            )
-            console_handler.setFormatter(formatter)
-            self.addHandler(console_handler)
-            # add file to log to
-            file_handler = logging.FileHandler("logs.log")
-            file_handler.setLevel(level)
-            file_handler.setFormatter(formatter)
-            self.addHandler(file_handler)
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance.setup()
+                cls._instance = instance
+        return cls._instance
+
+    def setup(self):
+        self.level = logging.DEBUG
+        self.loggers = {}
+        formatter = logging.Formatter(FORMAT)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        # add file to log to, only opened when the first record is written
+        file_handler = logging.FileHandler("logs.log", delay=True)
+        file_handler.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(log_queue)
+        self.listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler
+        )
+        self.listener.start()
+        # write out the records that are still on the queue when the build ends
+        atexit.register(self.listener.stop)
+
+    def get_logger(self, name):
+        with self._lock:
+            if name not in self.loggers:
+                logger = logging.getLogger(name)
+                logger.setLevel(self.level)
+                logger.addHandler(self.queue_handler)
+                logger.propagate = False
+                self.loggers[name] = logger
+            return self.loggers[name]
+
+    def set_level(self, level):
+        with self._lock:
+            self.level = level
+            for logger in self.loggers.values():
+                logger.setLevel(level)
+
+    def use_queue(self, log_queue, level):
+        """
+        send the records of all loggers to another queue,
+        a worker process uses this to pass its records to the listener of the build
+        :param log_queue: the queue to put the records on
+        :param level: the level of the loggers
+        """
+        with self._lock:
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            for logger in self.loggers.values():
+                logger.removeHandler(self.queue_handler)
+                logger.addHandler(queue_handler)
+            self.queue_handler = queue_handler
+        self.set_level(level)
+
+
+class lazy:
+    """
+    log argument that is only built when the record is written,
+    use as logger.debug("%s", lazy(json.dumps, data, indent=4))
+    so the expensive payload is skipped when the level is disabled
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.function(*self.args, **self.kwargs))
+
+
+def configure_logging(level):
+    """
+    set the level of all the loggers of the build
+    :param level: the level name (DEBUG, INFO, WARNING, ERROR) or number
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    SingletonLogger().set_level(level)
+
+
+@contextmanager
+def worker_log_queue():
+    """
+    a queue for the records of worker processes, the records are written
+    by the handlers of the build until the block ends.
+    A forked worker inherits the loggers but not the listener thread,
+    so it has to call use_worker_log_queue with what this yields
+    :return: tuple of the queue and the level to pass to use_worker_log_queue
+    """
+    singleton_logger = SingletonLogger()
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *singleton_logger.listener.handlers
+    )
+    listener.start()
+    try:
+        yield log_queue, singleton_logger.level
+    finally:
+        # the workers have ended, write out the records they left on the queue
+        listener.stop()
+        log_queue.close()
+        log_queue.join_thread()
+
+
+def use_worker_log_queue(log_queue, level):
+    """
+    log to the queue of worker_log_queue, call this first in a worker process
+    :param log_queue: the queue of worker_log_queue
+    :param level: the level of worker_log_queue
+    """
+    SingletonLogger().use_queue(log_queue, level)
 
 
 def get_warnings_log():
@@ -51,12 +165,10 @@ def get_errors_log():
     return errors
 
 
-def get_logger():
-    # Get the name of the calling module
-    frame = inspect.stack()[1]
-    module = inspect.getmodule(frame[0])
-    module_name = module.__name__
+def get_logger(name=None):
+    # Get the name of the calling module, without walking the whole stack
+    if name is None:
+        name = sys._getframe(1).f_globals.get("__name__", "root")
 
-    # Create a logger instance with the module name as its name
-    logger = SingletonLogger(module_name)
-    return logger
+    # Get the logger of the module, all loggers share the same handlers
+    return SingletonLogger().get_logger(name)
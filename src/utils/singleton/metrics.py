@@ -0,0 +1,66 @@
+# this file contains a singleton class that will hold the counters and the phase timings of the build
+# the counters can be incremented from any thread and are reported at the end of the build
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+from utils.singleton.location import singleton
+
+
+@singleton
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}  # phase => seconds, in the order the phases first ran
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Metrics(counters={self.counters}, timings={self.timings})"
+
+    def incr(self, name, amount=1):
+        """
+        increment the counter with the given name
+        :param name: the name of the counter
+        :param amount: the amount to add to the counter
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get(self, name):
+        return self.counters.get(name, 0)
+
+    def get_counters(self):
+        with self.lock:
+            return dict(sorted(self.counters.items()))
+
+    @contextmanager
+    def phase(self, name):
+        """
+        add the wall time of the with block to the timing of the phase,
+        a phase that runs more than once is added up
+        :param name: the name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def get_timings(self):
+        with self.lock:
+            return {name: round(seconds, 6) for name, seconds in self.timings.items()}
+
+    def write(self, path, **extra):
+        """
+        write the timings and the counters to a json file
+        :param path: the path of the json file
+        :param extra: other top level keys of the json file
+        """
+        content = dict(extra)
+        content["timings"] = self.get_timings()
+        content["counters"] = self.get_counters()
+        with open(path, "w") as f:
+            json.dump(content, f, indent=4)
@@ -0,0 +1,147 @@
+# this file contains a singleton class that profiles the build with cProfile and/or tracemalloc
+# the whole build is profiled, or only the phases that are selected, and the reports are
+# written to the build folder so they can be attached to an issue about a slow build
+# cProfile only sees the main thread and tracemalloc only the main process, main.py therefore
+# runs the build inline (--workers 1, --serialize-workers 1) while profiling
+
+import io
+import os
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from utils.singleton.location import singleton
+from utils.singleton.logger import get_logger
+
+logger = get_logger()
+
+# the name of the phase that wraps the whole build
+BUILD_PHASE = "build"
+
+# the files in the build folder the reports are written to
+CPU_PROFILE_FILE = "profile.pstats"
+CPU_REPORT_FILE = "profile.txt"
+MEMORY_REPORT_FILE = "memory.txt"
+
+
+@singleton
+class Profiler:
+    def __init__(self, cpu=False, memory=False, phases=None, top=30):
+        """
+        :param cpu: profile the cpu time with cProfile
+        :param memory: trace the allocations with tracemalloc
+        :param phases: the phases to profile, None or empty profiles the whole build
+        :param top: the number of functions and allocation sites in the reports
+        """
+        self.cpu = cpu
+        self.memory = memory
+        self.phases = set(phases or [])
+        self.top = top
+        self.profile = cProfile.Profile() if cpu else None
+        self.snapshots = []  # (phase, tracemalloc snapshot, peak bytes)
+
+    def __repr__(self) -> str:
+        return f"Profiler(cpu={self.cpu}, memory={self.memory}, phases={self.phases})"
+
+    def enabled(self):
+        return self.cpu or self.memory
+
+    def selected(self, name):
+        if len(self.phases) == 0:
+            return name == BUILD_PHASE
+        return name in self.phases
+
+    @contextmanager
+    def phase(self, name):
+        """
+        profile the with block when the phase is selected,
+        the cpu profile of all the selected phases is added up,
+        the allocations are reported per phase
+        :param name: the name of the phase
+        """
+        if not self.enabled() or not self.selected(name):
+            yield
+            return
+        logger.info(f"Profiling phase {name}")
+        if self.memory:
+            tracemalloc.start()
+        if self.cpu:
+            self.profile.enable()
+        try:
+            yield
+        finally:
+            if self.cpu:
+                self.profile.disable()
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.snapshots.append((name, tracemalloc.take_snapshot(), peak))
+                tracemalloc.stop()
+
+    def write(self, folder):
+        """
+        write the reports of the profiled phases to the folder
+        :param folder: the folder to write the reports to, normally the build folder
+        :return: list of the paths that were written
+        """
+        if not self.enabled():
+            return []
+        os.makedirs(folder, exist_ok=True)
+        written = []
+        if self.cpu:
+            path = os.path.join(folder, CPU_PROFILE_FILE)
+            self.profile.dump_stats(path)
+            written.append(path)
+            path = os.path.join(folder, CPU_REPORT_FILE)
+            with open(path, "w") as f:
+                f.write(self.cpu_report())
+            written.append(path)
+        if self.memory:
+            path = os.path.join(folder, MEMORY_REPORT_FILE)
+            with open(path, "w") as f:
+                f.write(self.memory_report())
+            written.append(path)
+        for path in written:
+            logger.info(f"Profile written to {path}")
+        return written
+
+    def cpu_report(self):
+        """
+        :return: the top functions by cumulative and by own time as text
+        """
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        return output.getvalue()
+
+    def memory_report(self):
+        """
+        :return: per profiled phase the peak and the top allocation sites
+        that were still allocated at the end of the phase, as text
+        """
+        lines = []
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        for name, snapshot, peak in self.snapshots:
+            statistics = snapshot.filter_traces(filters).statistics("lineno")
+            total = sum(statistic.size for statistic in statistics)
+            lines.append(
+                "phase {0}: peak {1:.1f} KiB, {2:.1f} KiB still allocated at the end".format(
+                    name, peak / 1024, total / 1024
+                )
+            )
+            for index, statistic in enumerate(statistics[: self.top], 1):
+                frame = statistic.traceback[0]
+                lines.append(
+                    "#{0}: {1}:{2}: {3:.1f} KiB in {4} blocks".format(
+                        index,
+                        frame.filename,
+                        frame.lineno,
+                        statistic.size / 1024,
+                        statistic.count,
+                    )
+                )
+            lines.append("")
+        return "\n".join(lines)
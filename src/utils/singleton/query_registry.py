@@ -0,0 +1,83 @@
+# this file contains a singleton class that will hold the sparql queries of the templates folder
+# each templates/*.sparql query is read, parsed and translated to its algebra once per process
+# queries are run with bound parameters instead of formatting values into the query string
+
+import os
+from rdflib import Namespace, RDF
+from rdflib.plugins.sparql import prepareQuery
+from utils.singleton.location import Location, singleton
+
+# namespaces that are bound for every query, so templates may leave out the prefixes
+NAMESPACES = {
+    "rdf": RDF,
+    "schema": Namespace("http://schema.org/"),
+    "prof": Namespace("http://www.w3.org/ns/dx/prof/"),
+}
+
+# the queries the build needs, by name of the template file without .sparql
+QUERIES = [
+    "profiles",
+    "candidate_profiles",
+]
+
+
+@singleton
+class QueryRegistry:
+    def __init__(self, templates_folder=None):
+        """
+        :param templates_folder: folder with the .sparql files, defaults to src/templates
+        """
+        if templates_folder is None:
+            templates_folder = os.path.join(
+                Location().get_location(), "templates"
+            )
+        self.templates_folder = templates_folder
+        self.queries = {}
+
+    def __repr__(self) -> str:
+        return f"QueryRegistry(queries={list(self.queries)})"
+
+    def load(self, names=QUERIES):
+        """
+        read and prepare the queries, call this once at startup
+        :param names: the names of the queries to load
+        :raises FileNotFoundError: when one or more templates are missing
+        """
+        missing = [
+            name
+            for name in names
+            if not os.path.isfile(self.template_path(name))
+        ]
+        if len(missing) > 0:
+            raise FileNotFoundError(
+                "Sparql template(s) {0} not found in {1}".format(
+                    ", ".join(name + ".sparql" for name in missing),
+                    self.templates_folder,
+                )
+            )
+        for name in names:
+            with open(self.template_path(name)) as f:
+                self.queries[name] = prepareQuery(f.read(), initNs=NAMESPACES)
+
+    def template_path(self, name):
+        return os.path.join(self.templates_folder, name + ".sparql")
+
+    def get(self, name):
+        """
+        get the prepared query, the query is loaded if load was not called for it
+        :param name: the name of the query
+        :return: the prepared query
+        """
+        if name not in self.queries:
+            self.load([name])
+        return self.queries[name]
+
+    def query(self, graph, name, **bindings):
+        """
+        run a prepared query on a graph
+        :param graph: the rdflib graph to query
+        :param name: the name of the query
+        :param bindings: values for the variables of the query, by variable name
+        :return: the query result
+        """
+        return graph.query(self.get(name), initBindings=bindings)
@@ -0,0 +1,138 @@
+# this file contains a singleton class that will hold the rate limits per host
+# every request of the build goes through this limiter so that requests to the same host are spaced out
+# each host has its own token bucket, so requests to different hosts never wait on each other
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from utils.singleton.location import singleton
+
+# longest Retry-After in seconds that is waited for by default
+MAX_RETRY_AFTER = 120
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate  # tokens added per second, None or 0 means no limit
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # set when the host asked us to back off
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"TokenBucket(rate={self.rate}, burst={self.capacity})"
+
+    def acquire(self):
+        """
+        wait until a token is available and take it,
+        the token is taken under the lock but the waiting is done outside of it,
+        so threads waiting for the same host do not queue up behind the lock
+        """
+        reserved = False
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if reserved or not self.rate:
+                        return
+                    self.tokens = min(
+                        self.capacity,
+                        self.tokens + (now - self.updated) * self.rate,
+                    )
+                    self.updated = now
+                    # when there is no token yet the count goes below 0,
+                    # every waiting thread then has its own turn to wait for
+                    self.tokens -= 1
+                    reserved = True
+                    if self.tokens >= 0:
+                        return
+                    wait = -self.tokens / self.rate
+            time.sleep(wait)
+
+    def block(self, seconds):
+        """
+        block the bucket for the given amount of seconds
+        """
+        with self.lock:
+            self.blocked_until = max(
+                self.blocked_until, time.monotonic() + seconds
+            )
+
+
+@singleton
+class RateLimiter:
+    def __init__(
+        self, rate=3.0, burst=3, host_rates=None, max_retry_after=MAX_RETRY_AFTER
+    ):
+        """
+        :param rate: default number of requests per second for each host
+        :param burst: number of requests that can be made at once before the rate applies
+        :param host_rates: dict of host => requests per second that overrides the default rate
+        :param max_retry_after: longest wait in seconds asked by a host that is honoured,
+        a longer Retry-After fails the request instead of stalling the build
+        """
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.max_retry_after = max_retry_after
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"RateLimiter(rate={self.rate}, host_rates={self.host_rates})"
+
+    def get_bucket(self, uri):
+        host = urlparse(str(uri)).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(
+                    rate=self.host_rates.get(host, self.rate),
+                    burst=self.burst,
+                )
+            return self.buckets[host]
+
+    def acquire(self, uri):
+        """
+        wait until a request to the host of the uri is allowed
+        :param uri: the uri that will be requested
+        """
+        self.get_bucket(uri).acquire()
+
+    def retry_after(self, uri, header, attempt=0):
+        """
+        block the host of the uri for the time asked in the Retry-After header
+        if there is no (valid) header then back off exponentially
+        :param uri: the uri that returned the 429/503 response
+        :param header: the value of the Retry-After header or None
+        :param attempt: the number of the failed attempt, starting at 0
+        :return: the number of seconds the host is blocked,
+        None when the host asks for more than max_retry_after seconds and is not blocked
+        """
+        seconds = parse_retry_after(header)
+        if seconds is None:
+            seconds = 2**attempt
+        if seconds > self.max_retry_after:
+            return None
+        self.get_bucket(uri).block(seconds)
+        return seconds
+
+
+def parse_retry_after(header):
+    """
+    parse a Retry-After header, this can be a number of seconds or a http date
+    :param header: the value of the header
+    :return: the number of seconds to wait or None if the header is not valid
+    """
+    if header is None:
+        return None
+    header = header.strip()
+    if header.isdigit():
+        return int(header)
+    try:
+        date = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
@@ -0,0 +1,59 @@
+# this file contains a singleton class that will hold all the responses fetched during the build
+# every (uri, Accept header) pair is fetched at most once, all later stages
+# (uri check, harvest, adding the profile to the registry) read the stored response
+
+import threading
+from utils.singleton.location import singleton
+from utils.singleton.metrics import Metrics
+
+
+@singleton
+class ResponseStore:
+    def __init__(self):
+        self.responses = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"ResponseStore(responses={len(self.responses)})"
+
+    def fetch(self, uri, accept, loader):
+        """
+        get the stored response for the uri and accept header,
+        the loader is only called when the pair was not fetched before.
+        Concurrent calls for the same pair wait for the first one to finish
+        :param uri: the uri of the response
+        :param accept: the Accept header of the request
+        :param loader: function without arguments that fetches the response
+        :return: the response
+        """
+        key = (str(uri), accept)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self.responses:
+                Metrics().incr("response_store.hits")
+                return self.responses[key]
+            response = loader()
+            Metrics().incr("response_store.fetches")
+            self.responses[key] = response
+            return response
+
+    def digest(self, hasher):
+        """
+        feed every stored response (uri, accept, status and body) to a hash,
+        in a fixed order so the same responses always give the same digest
+        :param hasher: a hashlib hash object
+        """
+        with self.lock:
+            keys = sorted(self.responses, key=lambda key: (key[0], key[1] or ""))
+        for uri, accept in keys:
+            response = self.responses[(uri, accept)]
+            hasher.update(
+                "{0}\n{1}\n{2}\n".format(
+                    uri, accept, getattr(response, "status_code", None)
+                ).encode("utf-8")
+            )
+            content = getattr(response, "content", None)
+            if content is not None:
+                hasher.update(content)
@@ -1,23 +1,64 @@
 # this utility file will contain all the functions that will be used to check the URI
 
-import requests
 import re
-import time
+from urllib.parse import urlsplit, urlunsplit
 from utils.singleton.logger import get_logger
+from utils.singleton.ratelimiter import RateLimiter
+from utils.singleton.http_cache import HttpCache
+from utils.singleton.metrics import Metrics
+from utils.singleton.response_store import ResponseStore
+from utils.singleton.http_client import HttpClient
 
 logger = get_logger()
 
+# status codes after which the host asks us to back off and try again
+RETRY_STATUS_CODES = (429, 503)
+
+# metadata files that stand for the folder they are in
+METADATA_FILES = ("ro-crate-metadata.json", "ro-crate-metadata.jsonld")
+
+# ports that are left out of a normalised uri
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_uri(uri):
+    """
+    normalise a uri so the variants of the same registry entry give the same key:
+    lowercase scheme and host, no default port, no fragment, no trailing slash
+    and no metadata file (METADATA_FILES) at the end of the path
+    :param uri: the uri to normalise
+    :return: the normalised uri, only to compare uris, not to fetch
+    """
+    try:
+        parts = urlsplit(str(uri).strip())
+        port = parts.port
+    except ValueError:
+        return str(uri).strip()
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = "{0}:{1}".format(host, port)
+    if "@" in parts.netloc:
+        host = "{0}@{1}".format(parts.netloc.rsplit("@", 1)[0], host)
+    path = parts.path
+    for metadata_file in METADATA_FILES:
+        if path.endswith("/" + metadata_file):
+            path = path[: -len(metadata_file)]
+    path = path.rstrip("/")
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
 
 # function to check if the URI is valid
-def check_uri(uri):
+def check_uri(uri, headers=None):
     """
     this function will check if the URI is valid
     :param uri: the URI to check
+    :param headers: the headers to send, use the same Accept as the harvester so the response is reused
     :return: True if valid, False if not
     """
     logger.info(f"Checking URI status code :{uri}")
     try:
-        response = get_url(uri)
+        response = get_url(uri, headers=headers)
         if response.status_code == 200:
             logger.info(f"URI {uri} is valid")
             return True
@@ -55,9 +96,90 @@ def check_if_json_return(uri):
         return False
 
 
-def get_url(uri):
-    time.sleep(0.3)
-    return requests.get(uri)
+def get_url(uri, headers=None, max_retries=3):
+    """
+    this function will do a GET request to the uri.
+    Each (uri, Accept header) pair is only fetched once per build,
+    later calls get the response kept in the ResponseStore
+    :param uri: the uri to get
+    :param headers: the headers to send with the request
+    :param max_retries: the number of times to retry after a 429/503
+    :return: the response
+    """
+    headers = dict(headers or {})
+    if set(headers) - {"Accept"}:
+        # other headers change the response, do not share it
+        return get_url_cached(uri, headers, max_retries)
+    return ResponseStore().fetch(
+        uri,
+        headers.get("Accept"),
+        lambda: get_url_cached(uri, headers, max_retries),
+    )
+
+
+def get_url_cached(uri, headers=None, max_retries=3):
+    """
+    this function will do a GET request to the uri.
+    When the HttpCache is enabled a cached response is revalidated with a
+    conditional request and its body is reused when the server answers 304
+    :param uri: the uri to get
+    :param headers: the headers to send with the request
+    :param max_retries: the number of times to retry after a 429/503
+    :return: the response
+    """
+    cache = HttpCache()
+    if not cache.enabled():
+        return get_url_rate_limited(uri, headers, max_retries)
+    headers = dict(headers or {})
+    accept = headers.get("Accept")
+    entry = cache.load(uri, accept)
+    if entry is None:
+        Metrics().incr("http_cache.misses")
+        response = get_url_rate_limited(uri, headers, max_retries)
+    else:
+        Metrics().incr("http_cache.revalidations")
+        headers.update(cache.conditional_headers(entry))
+        response = get_url_rate_limited(uri, headers, max_retries)
+        if response.status_code == 304:
+            Metrics().incr("http_cache.hits")
+            logger.debug(f"URI {uri} not modified, using cached response")
+            return cache.to_response(entry)
+        Metrics().incr("http_cache.misses")
+    cache.store(uri, accept, response)
+    return response
+
+
+def get_url_rate_limited(uri, headers=None, max_retries=3):
+    """
+    this function will do a GET request to the uri over the shared HttpClient, rate limited per host
+    when the host answers with 429 or 503 the Retry-After header is honoured
+    and the request is tried again, unless the host asks to wait longer than the limiter allows
+    :param uri: the uri to get
+    :param headers: the headers to send with the request
+    :param max_retries: the number of times to retry after a 429/503
+    :return: the response
+    """
+    limiter = RateLimiter()
+    for attempt in range(max_retries + 1):
+        limiter.acquire(uri)
+        response = HttpClient().get(uri, headers=headers)
+        if (
+            response.status_code not in RETRY_STATUS_CODES
+            or attempt == max_retries
+        ):
+            return response
+        seconds = limiter.retry_after(
+            uri, response.headers.get("Retry-After"), attempt=attempt
+        )
+        if seconds is None:
+            logger.error(
+                f"URI {uri} returned {response.status_code} and asks to retry after more than {limiter.max_retry_after} seconds, giving up"
+            )
+            return response
+        logger.warning(
+            f"URI {uri} returned {response.status_code}, retrying in {seconds} seconds"
+        )
+    return response
 
 
 def check_uri_content(uri):
@@ -76,7 +198,7 @@ def check_uri_content(uri):
     logger.info(f"Checking URI content :{uri}")
     try:
         # do the call with requests header set to application/ld+json
-        response = requests.get(uri, headers={"Accept": "application/ld+json"})
+        response = get_url(uri, headers={"Accept": "application/ld+json"})
         logger.debug(response.headers["content-type"])
         if "application/ld+json" in response.headers["content-type"]:
             return True
@@ -84,7 +206,7 @@ def check_uri_content(uri):
         if "application/json" in response.headers["content-type"]:
             return True
         # do the call with no requests header
-        response = requests.get(uri)
+        response = get_url(uri)
         if response.status_code == 200:
             # check if the html contains a <link href="./ro-crate-metadata.json"
             # rel="describedby" type="application/ld+json"> tag
@@ -0,0 +1,49 @@
+# the modules of the action are imported from src, like main.py does
+import os
+import sys
+import threading
+import functools
+import http.server
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from utils.singleton.location import Location  # noqa: E402
+from utils.singleton.ratelimiter import RateLimiter  # noqa: E402
+from utils.singleton.http_cache import HttpCache  # noqa: E402
+
+Location(root=os.path.abspath(SRC))
+# the tests only talk to the local web server, so without a rate limit and without an on-disk cache
+RateLimiter(rate=0)
+HttpCache(directory=None)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    # serves a folder, json as application/json, without logging every request
+    extensions_map = dict(
+        http.server.SimpleHTTPRequestHandler.extensions_map,
+        **{".json": "application/json", ".html": "text/html"}
+    )
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def web(tmp_path):
+    """
+    serve a temporary folder over http
+    :return: tuple of the folder and the base url it is served on, ending with a /
+    """
+    folder = tmp_path / "web"
+    folder.mkdir()
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(QuietHandler, directory=str(folder)),
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield folder, "http://127.0.0.1:{0}/".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,99 @@
+# the manifest only replaces outputs whose content changed, keeps the outputs of an unchanged source
+# and removes every file in the build folder that the build did not write
+
+import os
+from utils.build_manifest import BuildManifest, MANIFEST_FILE
+
+
+def write_output(manifest, name, text, source=None):
+    with manifest.output(name, source=source) as destination:
+        with open(destination, "w") as f:
+            f.write(text)
+
+
+def build(folder, outputs, inputs="inputs", sources=None):
+    """
+    do an incremental build that writes the outputs (name => text)
+    :return: the manifest of the build
+    """
+    sources = sources or {}
+    manifest = BuildManifest(str(folder))
+    manifest.set_inputs(inputs)
+    for name, text in outputs.items():
+        if name in sources and manifest.keep_unchanged([name], sources[name]):
+            continue
+        write_output(manifest, name, text, source=sources.get(name))
+    manifest.remove_stale()
+    manifest.save()
+    return manifest
+
+
+def test_unchanged_output_is_not_replaced(tmp_path):
+    build(tmp_path, {"index.html": "a", "profiles/p/index.html": "p"})
+    path = tmp_path / "profiles" / "p" / "index.html"
+    os.utime(path, ns=(0, 0))
+    build(tmp_path, {"index.html": "b", "profiles/p/index.html": "p"})
+    assert (tmp_path / "index.html").read_text() == "b"
+    # same content, the file keeps its modification time
+    assert os.stat(path).st_mtime_ns == 0
+    assert not any(name.startswith(".tmp-") for name in os.listdir(tmp_path))
+
+
+def test_unchanged_inputs_keep_all_outputs(tmp_path):
+    build(tmp_path, {"index.html": "a"})
+    manifest = BuildManifest(str(tmp_path))
+    manifest.set_inputs("inputs")
+    assert manifest.unchanged()
+    manifest.set_inputs("other inputs")
+    assert not manifest.unchanged()
+    # an output that was changed by hand is written again
+    (tmp_path / "index.html").write_text("edited")
+    manifest.set_inputs("inputs")
+    assert not manifest.unchanged()
+
+
+def test_outputs_of_an_unchanged_source_are_kept(tmp_path):
+    build(tmp_path, {"p1.html": "one", "p2.html": "two"}, sources={"p1.html": "s1", "p2.html": "s2"})
+    manifest = build(
+        tmp_path,
+        {"p1.html": "one, not written", "p2.html": "two changed"},
+        inputs="changed",
+        sources={"p1.html": "s1", "p2.html": "s2 changed"},
+    )
+    assert (tmp_path / "p1.html").read_text() == "one"
+    assert (tmp_path / "p2.html").read_text() == "two changed"
+    assert manifest.sources == {"p1.html": "s1", "p2.html": "s2 changed"}
+    # a kept output that was removed is written again
+    os.remove(tmp_path / "p1.html")
+    build(tmp_path, {"p1.html": "one again"}, sources={"p1.html": "s1"})
+    assert (tmp_path / "p1.html").read_text() == "one again"
+
+
+def test_files_not_written_by_the_build_are_removed(tmp_path):
+    # files from before there was a manifest
+    (tmp_path / "old" / "page").mkdir(parents=True)
+    (tmp_path / "old" / "page" / "index.html").write_text("old")
+    (tmp_path / "stray.txt").write_text("old")
+    build(tmp_path, {"index.html": "a", "profiles/p1/index.html": "p1"})
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST_FILE, "index.html", "profiles"])
+    # the outputs of the last build that this build does not write, but not the files it keeps
+    (tmp_path / "metrics.json").write_text("{}")
+    manifest = BuildManifest(str(tmp_path))
+    manifest.set_inputs("changed")
+    write_output(manifest, "index.html", "a")
+    manifest.remove_stale(keep={"metrics.json"})
+    manifest.save()
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST_FILE, "index.html", "metrics.json"])
+
+
+def test_csv_rows_are_reused_while_the_file_is_unchanged(tmp_path):
+    csv = tmp_path / "registry.csv"
+    csv.write_text("URI,contact\n")
+    manifest = BuildManifest(str(tmp_path / "build"))
+    assert manifest.csv_rows("registry.csv", os.stat(csv)) is None
+    manifest.set_csv_rows("registry.csv", os.stat(csv), [["http://a", "b"]])
+    manifest.save()
+    manifest = BuildManifest(str(tmp_path / "build"))
+    assert manifest.csv_rows("registry.csv", os.stat(csv)) == [["http://a", "b"]]
+    csv.write_text("URI,contact\nhttp://c,d\n")
+    assert manifest.csv_rows("registry.csv", os.stat(csv)) is None
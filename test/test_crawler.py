@@ -0,0 +1,86 @@
+# the crawler harvests the entries and the candidates they lead to once each,
+# breadth first, safe for cycles between registries and up to max_depth below an entry
+
+import json
+import pytest
+from rdflib import URIRef
+from utils.crawler import Crawler
+from utils.singleton.query_registry import QueryRegistry
+
+CONTEXT = {
+    "@vocab": "http://schema.org/",
+    "Profile": "http://www.w3.org/ns/dx/prof/Profile",
+    "hasPart": {"@id": "http://schema.org/hasPart", "@type": "@id"},
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def queries():
+    QueryRegistry().load()
+
+
+@pytest.fixture
+def registry_web(web):
+    """
+    registry.json lists p1.json and sub.json,
+    sub.json lists p2.json and registry.json again (a cycle)
+    """
+    folder, base = web
+    documents = {
+        "registry.json": {"@id": "", "@type": "CreativeWork", "hasPart": ["p1.json", "sub.json"]},
+        "sub.json": {"@id": "", "@type": "CreativeWork", "hasPart": ["p2.json", "registry.json"]},
+        "p1.json": {"@id": "", "@type": "Profile", "name": "profile one"},
+        "p2.json": {"@id": "", "@type": "Profile", "name": "profile two"},
+    }
+    for name, document in documents.items():
+        (folder / name).write_text(json.dumps(dict(document, **{"@context": CONTEXT})))
+    return base
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_crawl_follows_candidates_once(registry_web, workers):
+    base = registry_web
+    crawler = Crawler(workers=workers)
+    crawler.add_entry(base + "registry.json")
+    crawler.crawl()
+    assert set(crawler.harvesters) == {
+        base + name for name in ["registry.json", "sub.json", "p1.json", "p2.json"]
+    }
+    assert crawler.depths[base + "p2.json"] == 2
+    assert crawler.getProfiles(base + "registry.json") == {
+        URIRef(base + "p1.json"),
+        URIRef(base + "p2.json"),
+    }
+    # the cycle back to the registry is kept as provenance, it is not harvested again
+    assert base + "registry.json" in crawler.children[base + "sub.json"]
+    assert len(crawler.reachable(base + "registry.json")) == 4
+
+
+def test_complete_kg_holds_all_reachable_graphs(registry_web):
+    base = registry_web
+    crawler = Crawler()
+    crawler.add_entry(base + "registry.json")
+    crawler.crawl()
+    complete = crawler.getCompleteKG(base + "registry.json")
+    assert len(complete) == sum(len(harvester.kg) for harvester in crawler.harvesters.values())
+    # built once and reused
+    assert crawler.getCompleteKG(base + "registry.json") is complete
+    assert len(crawler.getCompleteKG(base + "p1.json")) < len(complete)
+
+
+def test_max_depth_stops_the_crawl(registry_web):
+    base = registry_web
+    crawler = Crawler(max_depth=1)
+    crawler.add_entry(base + "registry.json")
+    crawler.crawl()
+    assert base + "sub.json" in crawler.harvesters
+    assert base + "p2.json" not in crawler.harvesters
+
+
+def test_entries_are_harvested_once(registry_web):
+    base = registry_web
+    crawler = Crawler()
+    first = crawler.add_entry(base + "p1.json")
+    assert crawler.add_entry(base + "p1.json") is first
+    crawler.crawl()
+    assert list(crawler.harvesters) == [base + "p1.json"]
@@ -0,0 +1,77 @@
+# the on-disk http cache keeps responses that can be revalidated
+# and reuses their body when the server answers a conditional request with 304
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+from utils.singleton.http_cache import HttpCache
+from utils.singleton.metrics import Metrics
+from utils.uri_checks import get_url_cached
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = HttpCache()
+    monkeypatch.setattr(cache, "directory", str(tmp_path / "cache"))
+    return cache
+
+
+def make_response(headers, body=b"{}", status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "http://cache.test/a"
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    return response
+
+
+def test_store_and_load(cache):
+    response = make_response(
+        {"Content-Type": "application/json", "ETag": '"v1"', "Server": "test"}, b'{"a": 1}'
+    )
+    assert cache.store("http://cache.test/a", "application/json", response)
+    entry = cache.load("http://cache.test/a", "application/json")
+    assert entry["body"] == b'{"a": 1}'
+    # only CACHED_HEADERS are kept
+    assert entry["headers"] == {"Content-Type": "application/json", "ETag": '"v1"'}
+    # every Accept header has its own entry
+    assert cache.load("http://cache.test/a", "text/turtle") is None
+
+
+def test_responses_without_validators_are_not_stored(cache):
+    assert not cache.store("http://cache.test/b", None, make_response({}))
+    assert not cache.store(
+        "http://cache.test/b", None, make_response({"ETag": '"v1"'}, status_code=404)
+    )
+    assert cache.load("http://cache.test/b", None) is None
+
+
+def test_conditional_headers_and_to_response(cache):
+    headers = {
+        "Content-Type": "text/turtle; charset=utf-8",
+        "ETag": '"v1"',
+        "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT",
+    }
+    cache.store("http://cache.test/c", None, make_response(headers, b"<a> <b> <c> ."))
+    entry = cache.load("http://cache.test/c", None)
+    assert cache.conditional_headers(entry) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT",
+    }
+    response = cache.to_response(entry)
+    assert response.status_code == 200
+    assert response.encoding == "utf-8"
+    assert response.text == "<a> <b> <c> ."
+
+
+def test_unmodified_response_comes_from_the_cache(cache, web):
+    folder, base = web
+    (folder / "profile.json").write_text('{"name": "p"}')
+    hits = Metrics().get("http_cache.hits")
+    first = get_url_cached(base + "profile.json")
+    assert first.status_code == 200
+    # the local server sends Last-Modified and answers If-Modified-Since with a 304
+    second = get_url_cached(base + "profile.json")
+    assert Metrics().get("http_cache.hits") == hits + 1
+    assert second.status_code == 200
+    assert second.content == first.content
@@ -0,0 +1,119 @@
+# the index lookups of find_profiles/find_candidates must find the same uris
+# as the sparql templates they replace (find_profiles_sparql/find_candidates_sparql)
+
+import os
+import json
+import pytest
+from rdflib import Graph, Dataset, URIRef, BNode, RDF
+from utils.singleton.query_registry import QueryRegistry, NAMESPACES
+from utils.profileharvester import (
+    find_profiles,
+    find_candidates,
+    find_profiles_sparql,
+    find_candidates_sparql,
+)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+FIXTURES = sorted(name for name in os.listdir(DATA) if name.endswith(".json"))
+BASE = "https://example.org/test/data/"
+
+SCHEMA = NAMESPACES["schema"]
+PROF = NAMESPACES["prof"]
+
+# the terms of the ro-crate context the fixtures use, so the test does not fetch the remote context
+CONTEXT = {
+    "@vocab": "http://schema.org/",
+    "Profile": "http://www.w3.org/ns/dx/prof/Profile",
+    "label": "http://www.w3.org/2000/01/rdf-schema#label",
+    "about": {"@id": "http://schema.org/about", "@type": "@id"},
+    "conformsTo": {"@id": "http://purl.org/dc/terms/conformsTo", "@type": "@id"},
+    "hasPart": {"@id": "http://schema.org/hasPart", "@type": "@id"},
+    "license": {"@id": "http://schema.org/license", "@type": "@id"},
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def queries():
+    QueryRegistry().load()
+
+
+def load_fixture(name):
+    with open(os.path.join(DATA, name)) as f:
+        document = json.load(f)
+    document["@context"] = CONTEXT
+    graph = Graph()
+    graph.parse(data=document, format="json-ld", base=BASE + name)
+    return graph
+
+
+def branches_graph():
+    """
+    a graph with every branch of candidate_profiles.sparql,
+    including candidates that are found by more than one branch
+    """
+    graph = Graph()
+    crate = URIRef("https://example.org/crate/")
+    metadata = URIRef("https://example.org/crate/ro-crate-metadata.json")
+    registry = URIRef("https://example.org/registry/")
+    item_list = BNode()
+    profile = URIRef("https://example.org/profiles/p1")
+    # [] schema:about ?rocrate . ?rocrate schema:conformsTo ?candidate .
+    graph.add((metadata, SCHEMA.about, crate))
+    graph.add((crate, SCHEMA.conformsTo, URIRef("https://example.org/profiles/p2")))
+    graph.add((crate, SCHEMA.conformsTo, profile))
+    # [] schema:hasPart/schema:itemListElement ?candidate .
+    graph.add((registry, SCHEMA.hasPart, item_list))
+    graph.add((item_list, RDF.type, SCHEMA.ItemList))
+    graph.add((item_list, SCHEMA.itemListElement, profile))
+    graph.add((item_list, SCHEMA.itemListElement, URIRef("https://example.org/profiles/p3")))
+    # [] schema:hasPart ?candidate .
+    graph.add((registry, SCHEMA.hasPart, URIRef("https://example.org/profiles/p4")))
+    # conformsTo without about is not a candidate
+    graph.add((URIRef("https://example.org/other/"), SCHEMA.conformsTo, URIRef("https://example.org/profiles/p5")))
+    # profiles, one with a second type and one typed twice in the graph
+    graph.add((profile, RDF.type, PROF.Profile))
+    graph.add((profile, RDF.type, SCHEMA.CreativeWork))
+    graph.add((URIRef("https://example.org/profiles/p4"), RDF.type, PROF.Profile))
+    return graph
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_fixture_profiles(name):
+    graph = load_fixture(name)
+    assert set(find_profiles(graph)) == set(find_profiles_sparql(graph))
+    assert len(find_profiles(graph)) > 0
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_fixture_candidates(name):
+    graph = load_fixture(name)
+    assert set(find_candidates(graph)) == set(find_candidates_sparql(graph))
+
+
+def test_branches_profiles():
+    graph = branches_graph()
+    assert set(find_profiles(graph)) == set(find_profiles_sparql(graph))
+    assert set(find_profiles(graph)) == {
+        URIRef("https://example.org/profiles/p1"),
+        URIRef("https://example.org/profiles/p4"),
+    }
+
+
+def test_branches_candidates():
+    graph = branches_graph()
+    candidates = find_candidates(graph)
+    assert set(candidates) == set(find_candidates_sparql(graph))
+    assert len(candidates) == len(set(candidates))
+    for index in (1, 2, 3, 4):
+        assert URIRef("https://example.org/profiles/p{0}".format(index)) in candidates
+    assert URIRef("https://example.org/profiles/p5") not in candidates
+
+
+def test_dataset_graph():
+    # the crawler parses into the graphs of a Dataset
+    dataset = Dataset()
+    graph = dataset.graph(URIRef("https://example.org/graph"))
+    for triple in branches_graph():
+        graph.add(triple)
+    assert set(find_profiles(graph)) == set(find_profiles_sparql(graph))
+    assert set(find_candidates(graph)) == set(find_candidates_sparql(graph))
@@ -0,0 +1,85 @@
+# the token bucket spaces the requests to a host, without keeping its lock while waiting,
+# and the Retry-After of a host is honoured up to max_retry_after
+
+import time
+import threading
+from email.utils import formatdate
+from utils.singleton.ratelimiter import TokenBucket, RateLimiter, parse_retry_after
+
+
+def acquire_all(bucket, threads):
+    """
+    :return: the seconds after the start at which each of the threads got its token
+    """
+    start = time.monotonic()
+    times = []
+    workers = [
+        threading.Thread(target=lambda: (bucket.acquire(), times.append(time.monotonic() - start)))
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(times)
+
+
+def test_burst_is_not_delayed():
+    times = acquire_all(TokenBucket(rate=1, burst=5), 5)
+    assert times[-1] < 0.5
+
+
+def test_tokens_are_spaced_by_the_rate():
+    times = acquire_all(TokenBucket(rate=20, burst=1), 5)
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) > 0.03
+    assert times[-1] > 0.15
+
+
+def test_no_rate_is_no_limit():
+    times = acquire_all(TokenBucket(rate=0, burst=1), 20)
+    assert times[-1] < 0.5
+
+
+def test_waiting_does_not_hold_the_lock():
+    bucket = TokenBucket(rate=2, burst=1)
+    bucket.acquire()
+    waiter = threading.Thread(target=bucket.acquire)
+    waiter.start()
+    time.sleep(0.05)
+    # the waiter sleeps for its token, the lock is free in the meantime
+    assert bucket.lock.acquire(timeout=0.1)
+    bucket.lock.release()
+    waiter.join()
+
+
+def test_block_delays_the_next_token():
+    bucket = TokenBucket(rate=0, burst=1)
+    bucket.block(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after(" 30 ") == 30
+    assert parse_retry_after("soon") is None
+    seconds = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+    assert 50 < seconds <= 60
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0
+
+
+def test_retry_after_backs_off_without_header():
+    limiter = RateLimiter()
+    assert limiter.retry_after("http://backoff.test/a", None, attempt=0) == 1
+    assert limiter.retry_after("http://backoff.test/a", "garbage", attempt=3) == 8
+
+
+def test_retry_after_longer_than_the_cap_is_refused(monkeypatch):
+    limiter = RateLimiter()
+    monkeypatch.setattr(limiter, "max_retry_after", 10)
+    assert limiter.retry_after("http://capped.test/a", "86400") is None
+    # the host is not blocked
+    assert limiter.get_bucket("http://capped.test/a").blocked_until < time.monotonic()
+    assert limiter.retry_after("http://capped.test/a", "0") == 0
@@ -0,0 +1,109 @@
+# the streaming writers give files that read back as the same graph,
+# and the same graph always gives the same bytes, also when its blank nodes got new labels
+
+import gzip
+import pytest
+from rdflib import Graph, URIRef, BNode, Literal, Namespace, RDF, XSD
+from rdflib.compare import isomorphic
+from utils.rdf_writer import canonical_bnodes, nt_term
+from utils.rdflib_utils import serialize_snapshot, resolve_relative
+
+BASE = "http://example.org/reg/"
+SCHEMA = Namespace("http://schema.org/")
+
+TURTLE = """
+@prefix schema: <http://schema.org/> .
+<http://example.org/a?x=1&y=2> schema:name "multi\\nline \\"quoted\\" <tag> & amp\\r ü", "hallo"@nl-BE ;
+    schema:version "3"^^<http://www.w3.org/2001/XMLSchema#integer> ;
+    <http://other.org/ns#prop> [ a schema:Thing ; schema:name "inner" ; schema:about [ schema:name "deeper" ] ] ;
+    <http://third.org/v/prop-2> "" .
+<http://example.org/b> schema:hasPart [ schema:name "same" ], [ schema:name "same" ] .
+"""
+
+FORMATS = ["turtle", "nt", "json-ld", "xml"]
+
+
+def parse():
+    # every parse gives the blank nodes new labels
+    graph = Graph()
+    graph.bind("schema", str(SCHEMA))
+    graph.parse(data=TURTLE, format="turtle")
+    return graph
+
+
+def write(tmp_path, graph, format, base=None):
+    path = tmp_path / "registry.{0}".format(format)
+    serialize_snapshot(list(graph), list(graph.namespaces()), format, str(path), base=base)
+    return path
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_files_read_back_as_the_same_graph(tmp_path, format):
+    graph = parse()
+    back = Graph().parse(str(write(tmp_path, graph, format)), format=format)
+    assert isomorphic(graph, back)
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_same_graph_gives_the_same_bytes(tmp_path, format):
+    first = write(tmp_path, parse(), format).read_bytes()
+    graph = parse()
+    # the order the triples come in does not matter either
+    triples = sorted(graph, key=str, reverse=True)
+    path = tmp_path / "again"
+    serialize_snapshot(triples, list(graph.namespaces()), format, str(path))
+    assert path.read_bytes() == first
+
+
+def test_turtle_keeps_relative_uris_under_its_base(tmp_path):
+    graph = Graph()
+    graph.add((URIRef("./"), RDF.type, SCHEMA.CreativeWork))
+    graph.add((URIRef("./"), SCHEMA.hasPart, URIRef("profiles/p1")))
+    text = write(tmp_path, graph, "turtle", base=BASE).read_text()
+    assert text.startswith("@base <{0}> .\n".format(BASE))
+    assert "<./>" in text
+    # the other formats get the uris resolved against the base
+    nt = write(tmp_path, graph, "nt", base=BASE).read_text()
+    assert "<{0}profiles/p1>".format(BASE) in nt
+    assert resolve_relative(URIRef("./"), BASE) == URIRef(BASE)
+
+
+def test_compressed_copy_is_the_same_and_stable(tmp_path):
+    graph = parse()
+    for name in ["a", "b"]:
+        serialize_snapshot(
+            list(graph),
+            list(graph.namespaces()),
+            "nt",
+            str(tmp_path / (name + ".nt")),
+            compressed_destination=str(tmp_path / (name + ".nt.gz")),
+        )
+    assert gzip.decompress((tmp_path / "a.nt.gz").read_bytes()) == (tmp_path / "a.nt").read_bytes()
+    assert (tmp_path / "a.nt.gz").read_bytes() == (tmp_path / "b.nt.gz").read_bytes()
+
+
+def test_canonical_bnodes_keeps_distinct_nodes_apart():
+    graph = parse()
+    triples = canonical_bnodes(graph)
+    assert len(triples) == len(graph)
+    labels = {term for triple in triples for term in triple if isinstance(term, BNode)}
+    assert labels == {BNode("b{0}".format(index)) for index in range(len(labels))}
+    # the two nodes with the same name stay two nodes
+    assert len(labels) == 4
+    result = Graph()
+    for triple in triples:
+        result.add(triple)
+    assert isomorphic(graph, result)
+
+
+def test_nt_term_writes_literals_on_one_line():
+    assert nt_term(Literal("a\nb\r\"c\\")) == '"a\\nb\\r\\"c\\\\"'
+    assert nt_term(Literal("hallo", lang="nl")) == '"hallo"@nl'
+    assert nt_term(Literal("3", datatype=XSD.integer)) == '"3"^^<{0}>'.format(XSD.integer)
+    assert nt_term(URIRef("http://example.org/a")) == "<http://example.org/a>"
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_empty_graph(tmp_path, format):
+    back = Graph().parse(str(write(tmp_path, Graph(), format)), format=format)
+    assert len(back) == 0
@@ -0,0 +1,86 @@
+# every (uri, Accept header) pair is fetched once per build, also when threads ask for it at the same time,
+# and the digest of the stored responses does not depend on the order they were fetched in
+
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from utils.singleton.response_store import ResponseStore
+
+
+def counting_loader(calls, delay=0.0, content=b"body"):
+    def loader():
+        calls.append(1)
+        time.sleep(delay)
+        return SimpleNamespace(status_code=200, content=content)
+
+    return loader
+
+
+def test_each_pair_is_fetched_once():
+    store = ResponseStore()
+    calls = []
+    first = store.fetch("http://store.test/once", "text/turtle", counting_loader(calls))
+    again = store.fetch("http://store.test/once", "text/turtle", counting_loader(calls))
+    assert first is again
+    assert len(calls) == 1
+    # another Accept header is another response
+    store.fetch("http://store.test/once", "application/ld+json", counting_loader(calls))
+    assert len(calls) == 2
+
+
+def test_concurrent_fetches_wait_for_the_first():
+    store = ResponseStore()
+    calls = []
+    loader = counting_loader(calls, delay=0.1)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(
+            executor.map(
+                lambda _: store.fetch("http://store.test/concurrent", None, loader),
+                range(8),
+            )
+        )
+    assert len(calls) == 1
+    assert all(response is responses[0] for response in responses)
+
+
+def test_other_pairs_are_not_blocked_by_a_slow_fetch():
+    store = ResponseStore()
+    slow = threading.Thread(
+        target=store.fetch,
+        args=("http://store.test/slow", None, counting_loader([], delay=0.5)),
+    )
+    slow.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    store.fetch("http://store.test/fast", None, counting_loader([]))
+    assert time.monotonic() - start < 0.3
+    slow.join()
+
+
+def test_digest_does_not_depend_on_the_fetch_order(monkeypatch):
+    store = ResponseStore()
+    responses = {
+        ("http://store.test/digest-a", None): SimpleNamespace(status_code=200, content=b"a"),
+        ("http://store.test/digest-b", "text/turtle"): SimpleNamespace(status_code=404, content=b"b"),
+    }
+    digests = []
+    for keys in [list(responses), list(reversed(responses))]:
+        monkeypatch.setattr(store, "responses", {key: responses[key] for key in keys})
+        hasher = hashlib.sha256()
+        store.digest(hasher)
+        digests.append(hasher.hexdigest())
+    assert digests[0] == digests[1]
+    # a changed body changes the digest
+    monkeypatch.setattr(
+        store,
+        "responses",
+        {
+            **responses,
+            ("http://store.test/digest-a", None): SimpleNamespace(status_code=200, content=b"A"),
+        },
+    )
+    hasher = hashlib.sha256()
+    store.digest(hasher)
+    assert hasher.hexdigest() != digests[0]